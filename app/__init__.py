@@ -1,6 +1,6 @@
 from flask import Flask, session
 from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager
+from flask_login import LoginManager, user_logged_in
 from flask_admin import Admin
 from flask_security import Security
 from flask_mail import Mail
@@ -9,16 +9,18 @@ from flask_wtf.csrf import CSRFProtect
 from dotenv import load_dotenv
 import os
 from datetime import datetime
-from sqlalchemy.orm import joinedload
 from app.utils.filters import format_datetime
+from app.utils.database import RoutingSession
+from app.utils.ratelimit import parse_limits
 
 # Load environment variables
 load_dotenv()
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
-admin = Admin(template_mode='bootstrap4')
+# Flask-Admin's index would otherwise shadow the dashboard at /admin/
+admin = Admin(template_mode='bootstrap4', url='/flask-admin')
 mail = Mail()
 migrate = Migrate()
 security = Security()
@@ -39,10 +41,59 @@ def create_app(test_config=None):
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-please-change')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///blog.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Private folder for files the workers share (defaults to instance/runtime)
+    app.config['RUNTIME_DIR'] = os.getenv('RUNTIME_DIR')
+    
+    # Connection pool (not used for in-memory SQLite)
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 5))
+    app.config['DB_POOL_MAX_OVERFLOW'] = int(os.getenv('DB_POOL_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 3600))
+    
+    # SQLite production profile, applied to every new connection
+    app.config['SQLITE_PROFILE'] = os.getenv('SQLITE_PROFILE', 'true').lower() in ('true', '1', 'yes')
+    app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))  # ms
+    app.config['SQLITE_CACHE_SIZE'] = int(os.getenv('SQLITE_CACHE_SIZE', -65536))  # negative means KiB
+    app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 268435456))  # bytes
+    
+    # Read replicas for read-only views, and how long a user who just wrote reads from the primary
+    app.config['SQLALCHEMY_REPLICAS'] = [url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url]
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
     app.config['SECURITY_PASSWORD_SALT'] = os.getenv('SECURITY_PASSWORD_SALT', 'dev-salt-please-change')
     app.config['SECURITY_TWO_FACTOR_ENABLED'] = True
     app.config['SECURITY_TWO_FACTOR_SECRET'] = os.getenv('SECURITY_TWO_FACTOR_SECRET', 'dev-2fa-secret-please-change')
     
+    # Password hashing: any werkzeug method, and a process pool for the work (0 runs it inline)
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 0))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.getenv('PASSWORD_HASH_QUEUE', 0))  # 0 means 4 per worker
+    
+    # Rate limits on POSTs per client address, as endpoint=count/period pairs over the defaults
+    app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    app.config['RATELIMITS'] = parse_limits(os.getenv('RATELIMITS'))
+    app.config['RATELIMIT_SLOTS'] = int(os.getenv('RATELIMIT_SLOTS', 4096))  # clients tracked at once
+    
+    # Search configuration
+    app.config['SEARCH_BACKEND'] = os.getenv('SEARCH_BACKEND', 'auto')
+    app.config['SEARCH_INDEX_PATH'] = os.getenv('SEARCH_INDEX_PATH')
+    app.config['SEARCH_CACHE_SIZE'] = int(os.getenv('SEARCH_CACHE_SIZE', 512))
+    app.config['SEARCH_CACHE_TTL'] = int(os.getenv('SEARCH_CACHE_TTL', 300))
+    
+    # Page cache configuration (memory, filesystem or redis; off when unset)
+    app.config['PAGE_CACHE'] = os.getenv('PAGE_CACHE')
+    app.config['PAGE_CACHE_URL'] = os.getenv('PAGE_CACHE_URL')
+    app.config['PAGE_CACHE_DIR'] = os.getenv('PAGE_CACHE_DIR')
+    app.config['PAGE_CACHE_TTL'] = int(os.getenv('PAGE_CACHE_TTL', 300))
+    app.config['PAGE_CACHE_MAX_FILES'] = int(os.getenv('PAGE_CACHE_MAX_FILES', 10000))  # filesystem store only
+    
+    # Comments shown per page on a post
+    app.config['COMMENTS_PER_PAGE'] = int(os.getenv('COMMENTS_PER_PAGE', 20))
+    
+    # Feed configuration
+    app.config['FEED_ENTRY_COUNT'] = int(os.getenv('FEED_ENTRY_COUNT', 20))
+    
     # Session configuration
     app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HTTPS
     app.config['SESSION_COOKIE_HTTPONLY'] = True
@@ -54,42 +105,45 @@ def create_app(test_config=None):
         app.config.update(test_config)
     
     # Initialize extensions with app
-    db.init_app(app)
+    from app.utils.database import init_database
+    init_database(app)
     login_manager.init_app(app)
     admin.init_app(app)
     mail.init_app(app)
     migrate.init_app(app, db)
     csrf.init_app(app)  # Initialize CSRF protection
     
+    # Set up caches and full-text search
+    from app.utils.cache import init_cache
+    from app.pagecache import init_page_cache
+    init_cache(app)
+    init_page_cache(app)
+    from app.utils.identity import init_identity_cache
+    init_identity_cache(app)
+    from app.utils.passwords import init_passwords
+    init_passwords(app)
+    from app.utils.ratelimit import init_rate_limits
+    init_rate_limits(app)
+    from app.search import init_search
+    init_search(app)
+    
     # Configure Flask-Login
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page! >_<'
     login_manager.login_message_category = 'info'
     login_manager.session_protection = 'strong'
     
-    # Make sessions permanent by default
-    @app.before_request
-    def make_session_permanent():
+    # Only signed-in users get a (permanent) session; anonymous visitors are
+    # never sent a cookie, so their pages stay cacheable
+    @user_logged_in.connect_via(app)
+    def make_session_permanent(sender, user):
         session.permanent = True
     
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models.user import User
-        print(f"DEBUG: Loading user {user_id}")
-        # Try loading by fs_uniquifier first
-        user = User.query.options(joinedload(User.roles)).filter_by(fs_uniquifier=user_id).first()
-        if not user:
-            # Try loading by ID if fs_uniquifier fails
-            try:
-                user = User.query.options(joinedload(User.roles)).get(int(user_id))
-            except (ValueError, TypeError):
-                user = None
-        
-        if user:
-            print(f"DEBUG: Found user {user.email} with roles {[role.name for role in user.roles]}")
-        else:
-            print(f"DEBUG: No user found for ID {user_id}")
-        return user
+        # Served from the identity cache, so most requests make no auth queries
+        from app.utils.identity import load_identity
+        return load_identity(user_id)
     
     # Add template filters
     @app.template_filter('format_date')
@@ -113,4 +167,8 @@ def create_app(test_config=None):
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(user_bp)
     
+    # Register maintenance commands
+    from app.cli import posts_cli
+    app.cli.add_command(posts_cli)
+    
     return app
@@ -0,0 +1,92 @@
+"""Maintenance commands for blog content"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import os
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, func, select
+from app import db
+from app.models.comment import Comment
+from app.models.post import Post
+from app.utils.text import derive_text
+
+posts_cli = AppGroup('posts', help='Maintain blog posts.')
+
+def _derive_batch(rows):
+    """Derive text columns for a batch of ``(id, content)`` rows"""
+    derived = []
+    for post_id, content in rows:
+        text, count = derive_text(content)
+        derived.append({'b_id': post_id, 'b_text': text, 'b_count': count})
+    return derived
+
+def _content_batches(batch_size, missing_only):
+    """Yield ``(id, content)`` batches in id order"""
+    last_id = 0
+    while True:
+        query = db.session.query(Post.id, Post.content).filter(Post.id > last_id)
+        if missing_only:
+            query = query.filter(Post.content_text.is_(None))
+        rows = query.order_by(Post.id).limit(batch_size).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [tuple(row) for row in rows]
+
+@posts_cli.command('backfill-text')
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True,
+              help='Processes used to strip HTML and count words.')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Posts read and written per batch.')
+@click.option('--all', 'everything', is_flag=True,
+              help='Recompute every post, not only posts missing plain text.')
+def backfill_text_command(workers, batch_size, everything):
+    """Fill in plain text and word counts for existing posts."""
+    table = Post.__table__
+    # Core updates still run the column's onupdate, so keep updated_at as it was
+    update = table.update().where(table.c.id == bindparam('b_id')).values(
+        content_text=bindparam('b_text'), word_count=bindparam('b_count'),
+        updated_at=table.c.updated_at
+    )
+    batches = _content_batches(batch_size, not everything)
+    total = 0
+
+    def write(derived):
+        nonlocal total
+        db.session.execute(update, derived)
+        db.session.commit()
+        total += len(derived)
+
+    if workers > 1:
+        # Keep a couple of batches per worker in flight rather than
+        # handing the whole table to the pool up front
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.submit(_derive_batch, batch))
+                if len(pending) >= workers * 2:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    else:
+        for batch in batches:
+            write(_derive_batch(batch))
+    click.echo(f'Backfilled plain text for {total} posts ✨')
+
+@posts_cli.command('reconcile-comments')
+def reconcile_comments_command():
+    """Recompute every post's comment count from the comments table."""
+    table = Post.__table__
+    actual = select(func.count(Comment.id))\
+        .where(Comment.post_id == table.c.id)\
+        .scalar_subquery()
+    # One statement for the whole table, touching only posts that drifted;
+    # their cached comment lists may be stale too, so move their versions on
+    result = db.session.execute(
+        table.update()
+        .where(table.c.comment_count != actual)
+        .values(comment_count=actual, comments_version=table.c.comments_version + 1,
+                updated_at=table.c.updated_at)
+    )
+    db.session.commit()
+    click.echo(f'Reconciled comment counts for {result.rowcount} posts ✨')
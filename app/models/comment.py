@@ -1,10 +1,16 @@
 """Comment model for blog posts"""
 from datetime import datetime, timezone
+from sqlalchemy import event
 from app import db
+from app.models.post import Post
 
 class Comment(db.Model):
     """Comment model"""
     __tablename__ = 'comments'
+    __table_args__ = (
+        # Serves a post's comments newest first
+        db.Index('ix_comments_post_id_created_at', 'post_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
@@ -13,7 +19,7 @@ class Comment(db.Model):
     
     # Foreign keys
     post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
-    author_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
     
     # Relationships
     post = db.relationship('Post', back_populates='comments')
@@ -22,3 +28,25 @@ class Comment(db.Model):
     def __repr__(self):
         """String representation"""
         return f'<Comment by {self.author.username} on post {self.post.title}>'
+
+def _adjust_comment_count(connection, post_id, delta):
+    """Move a post's comment count and version inside the flushing transaction"""
+    table = Post.__table__
+    # Core updates run the column's onupdate, so keep updated_at as it was
+    connection.execute(
+        table.update()
+        .where(table.c.id == post_id)
+        .values(
+            comment_count=table.c.comment_count + delta,
+            comments_version=table.c.comments_version + 1,
+            updated_at=table.c.updated_at
+        )
+    )
+
+@event.listens_for(Comment, 'after_insert')
+def _count_new_comment(mapper, connection, comment):
+    _adjust_comment_count(connection, comment.post_id, 1)
+
+@event.listens_for(Comment, 'after_delete')
+def _count_deleted_comment(mapper, connection, comment):
+    _adjust_comment_count(connection, comment.post_id, -1)
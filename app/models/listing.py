@@ -0,0 +1,87 @@
+"""Column-only queries for post listings
+
+Listing pages only show a title, link, date and a short preview, so they
+select those columns into :class:`PostCard` objects instead of loading full
+``Post`` instances with their bodies into the identity map.
+"""
+from sqlalchemy import func, tuple_
+from app import db
+from app.models.post import Post
+from app.models.user import User
+
+# Characters of plain text shown when a post has no summary
+EXCERPT_LENGTH = 200
+
+class PostCard:
+    """Lightweight, read-only stand-in for a post in listings"""
+    __slots__ = (
+        'id', 'title', 'slug', 'summary', 'excerpt', 'is_published',
+        'created_at', 'published_at', 'author_name', 'comment_count'
+    )
+
+    def __init__(self, id, title, slug, summary, excerpt, is_published,
+                 created_at, published_at, author_name, comment_count):
+        self.id = id
+        self.title = title
+        self.slug = slug
+        self.summary = summary
+        self.excerpt = excerpt
+        self.is_published = is_published
+        self.created_at = created_at
+        self.published_at = published_at
+        self.author_name = author_name
+        self.comment_count = comment_count
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    @property
+    def preview(self):
+        """The summary, or the start of the plain text"""
+        if self.summary:
+            return self.summary
+        excerpt = self.excerpt or ''
+        return excerpt[:EXCERPT_LENGTH] + '...' if len(excerpt) > EXCERPT_LENGTH else excerpt
+
+def post_cards():
+    """Query selecting the columns of :class:`PostCard`, in order"""
+    return db.session.query(
+        Post.id,
+        Post.title,
+        Post.slug,
+        Post._summary,
+        # One character past the limit tells the card to add an ellipsis
+        func.substr(Post.content_text, 1, EXCERPT_LENGTH + 1),
+        Post.is_published,
+        Post.created_at,
+        Post.published_at,
+        User.username,
+        Post.comment_count
+    ).outerjoin(Post.author)
+
+def published_post_cards():
+    """Query for cards of published posts"""
+    return post_cards().filter(
+        Post.is_published == True,
+        Post.published_at.isnot(None)
+    )
+
+def post_neighbors(post):
+    """The published posts just older and newer than ``post``, as ``(id, slug, title)`` rows
+
+    Each side is a single-row seek on the ``(is_published, published_at, id)``
+    index, however long the archive gets.
+    """
+    key, here = tuple_(Post.published_at, Post.id), tuple_(post.published_at, post.id)
+    published = db.session.query(Post.id, Post.slug, Post.title).filter(
+        Post.is_published == True,
+        Post.published_at.isnot(None)
+    )
+    older = published.filter(key < here)\
+        .order_by(Post.published_at.desc(), Post.id.desc())\
+        .first()
+    newer = published.filter(key > here)\
+        .order_by(Post.published_at.asc(), Post.id.asc())\
+        .first()
+    return older, newer
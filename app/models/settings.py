@@ -0,0 +1,15 @@
+"""Site-wide settings, one row per key"""
+from datetime import datetime, timezone
+from app import db
+
+class SiteSetting(db.Model):
+    """A global setting such as whether registration is open"""
+    __tablename__ = 'site_settings'
+    
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.JSON)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        """String representation"""
+        return f'<SiteSetting {self.key}={self.value!r}>'
@@ -0,0 +1,88 @@
+"""Signals announcing changes to blog posts
+
+Listeners on the Flask-SQLAlchemy session collect a lightweight snapshot of
+every post touched by a flush. ``posts_flushed`` is sent inside the flush so
+receivers can write to the same transaction, and ``posts_committed`` is sent
+once the transaction has committed so in-process caches can be updated.
+Every committed post change also bumps the shared ``content`` generation.
+``comments_committed`` carries the ids of posts whose comments changed.
+"""
+from collections import namedtuple
+from blinker import Namespace
+from flask import current_app
+from sqlalchemy import event
+from app import db
+from app.models.comment import Comment
+from app.models.post import Post
+from app.utils.cache import bump_generation
+
+_signals = Namespace()
+
+posts_flushed = _signals.signal('posts-flushed')
+posts_committed = _signals.signal('posts-committed')
+comments_committed = _signals.signal('comments-committed')
+
+PostState = namedtuple('PostState', [
+    'id', 'title', 'slug', 'content', 'is_published', 'published_at', 'updated_at', 'deleted'
+])
+
+def _snapshot(post, deleted=False):
+    """Capture the searchable fields of a post"""
+    return PostState(
+        id=post.id,
+        title=post.title,
+        slug=post.slug,
+        content=post.content,
+        is_published=bool(post.is_published and post.published_at),
+        published_at=post.published_at,
+        updated_at=post.updated_at,
+        deleted=deleted
+    )
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_post_changes(session, flush_context):
+    """Snapshot posts inserted, updated or deleted by this flush"""
+    commented = {
+        obj.post_id for obj in session.new | session.dirty | session.deleted
+        if isinstance(obj, Comment)
+    }
+    if commented:
+        session.info.setdefault('comment_posts', set()).update(commented)
+
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Post):
+            changes.append(_snapshot(obj))
+    for obj in session.dirty:
+        if isinstance(obj, Post) and session.is_modified(obj, include_collections=False):
+            changes.append(_snapshot(obj))
+    for obj in session.deleted:
+        if isinstance(obj, Post):
+            changes.append(_snapshot(obj, deleted=True))
+
+    if not changes:
+        return
+
+    pending = session.info.setdefault('post_changes', {})
+    for state in changes:
+        pending[state.id] = state
+
+    posts_flushed.send(current_app._get_current_object(), session=session, changes=changes)
+
+@event.listens_for(db.session, 'after_commit')
+def _announce_post_changes(session):
+    """Send the posts changed by the committed transaction"""
+    pending = session.info.pop('post_changes', None)
+    if pending:
+        bump_generation('content')
+        posts_committed.send(current_app._get_current_object(), changes=list(pending.values()))
+
+    commented = session.info.pop('comment_posts', None)
+    if commented:
+        comments_committed.send(current_app._get_current_object(), post_ids=commented)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_post_changes(session):
+    """Forget changes that never made it to the database"""
+    session.info.pop('post_changes', None)
+    session.info.pop('comment_posts', None)
@@ -1,17 +1,13 @@
 from app import db
 from flask_security import UserMixin, RoleMixin
 from datetime import datetime, timezone
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.utils.passwords import hasher
 import uuid
-import qrcode
-import base64
-from io import BytesIO
-import pyotp
 
 # Role-User association table for Flask-Security
 roles_users = db.Table('roles_users',
-    db.Column('user_id', db.Integer(), db.ForeignKey('user.id')),
-    db.Column('role_id', db.Integer(), db.ForeignKey('role.id'))
+    db.Column('user_id', db.Integer(), db.ForeignKey('user.id'), primary_key=True),
+    db.Column('role_id', db.Integer(), db.ForeignKey('role.id'), primary_key=True)
 )
 
 class Role(db.Model, RoleMixin):
@@ -22,6 +18,12 @@ class Role(db.Model, RoleMixin):
 
 class User(db.Model, UserMixin):
     """User model with 2FA support"""
+    __table_args__ = (
+        # Serve the admin user list and its pending approvals, newest first
+        db.Index('ix_user_created_at', 'created_at'),
+        db.Index('ix_user_is_approved_created_at', 'is_approved', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False)
     username = db.Column(db.String(255), unique=True, nullable=False)
@@ -42,9 +44,8 @@ class User(db.Model, UserMixin):
     avatar_url = db.Column(db.String(255))
     website = db.Column(db.String(255))
     
-    # User status and registration control
+    # User status
     is_approved = db.Column(db.Boolean(), default=False)
-    registration_enabled = db.Column(db.Boolean(), default=False, server_default='0')
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
@@ -60,33 +61,40 @@ class User(db.Model, UserMixin):
     def __str__(self):
         return f'<User {self.email}>'
 
+    @property
+    def role_names(self):
+        """Frozen set of the user's role names
+
+        Users from the identity cache come with it filled in, so role checks
+        on the signed-in user never touch the database.
+        """
+        names = self.__dict__.get('_role_names')
+        if names is None:
+            names = frozenset(role.name for role in self.roles)
+        return names
+
+    def has_role(self, role):
+        """Check for a role, given its name or the Role itself"""
+        return (role if isinstance(role, str) else role.name) in self.role_names
+
     @property
     def is_admin(self):
         """Check if user has admin role"""
-        roles = list(self.roles)  # Force load roles
-        print(f"DEBUG: User {self.email} has roles: {[role.name for role in roles]}")
-        return any(role.name == 'admin' for role in roles)
+        return self.has_role('admin')
 
     def set_password(self, password):
         """Set password hash for user"""
-        self.password = generate_password_hash(password)
+        self.password = hasher().hash(password)
 
     def check_password(self, password):
         """Check if password matches hash"""
-        return check_password_hash(self.password, password)
+        return hasher().verify(self.password, password)
+
+    def password_needs_rehash(self):
+        """Check if the password hash predates the current hashing settings"""
+        return hasher().needs_rehash(self.password)
 
     def get_2fa_qr_code(self):
-        """Generate QR code for 2FA setup"""
-        if not self.tf_totp_secret:
-            return None
-            
-        totp = pyotp.TOTP(self.tf_totp_secret)
-        provisioning_uri = totp.provisioning_uri(
-            self.email,
-            issuer_name='Retro Blog'
-        )
-        
-        img = qrcode.make(provisioning_uri)
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode()
+        """SVG QR code for 2FA setup"""
+        from app.utils.qr import two_factor_qr
+        return two_factor_qr(self)
@@ -0,0 +1,201 @@
+"""Full-page cache for anonymous GET requests
+
+Opt in with ``PAGE_CACHE`` set to ``memory`` (per worker), ``filesystem``
+(shared by the workers of one host through ``PAGE_CACHE_DIR``) or ``redis``
+(shared by every host through ``PAGE_CACHE_URL``). Views opt in with
+:func:`cached_page`. Pages are tagged with what they show and purged once a
+post or comment change behind them has been committed.
+"""
+import json
+import time
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, g, make_response, request, session
+from flask_login import current_user
+from app.models.signals import comments_committed, posts_committed
+from app.utils.database import on_primary
+from app.pagecache.stores import FilesystemStore, MemoryStore, RedisStore, STORE_ERRORS
+
+STORES = {store.name: store for store in (MemoryStore, FilesystemStore, RedisStore)}
+
+# Bumped before every purge; a page whose render overlapped a purge is not stored
+WRITES_TAG = '*writes'
+
+# Headers that describe the visitor or the connection rather than the page
+UNCACHED_HEADERS = {'set-cookie', 'content-length', 'date', 'vary', 'x-page-cache'}
+
+# Session keys that carry no visitor data
+SESSION_FLAGS = {'_permanent', '_fresh'}
+
+LISTING_TAG = 'listing'
+
+# Post pages, whose previous/next links move whenever a published post changes
+ARCHIVE_TAG = 'archive'
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+class PageCache:
+    """Stores rendered responses under the tag versions they were built with"""
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+
+    def load(self, key):
+        """Return a fresh cached response for ``key``, or None"""
+        try:
+            raw = self.store.get(key)
+            if raw is None:
+                return None
+            header, _, body = raw.partition(b'\n')
+            meta = json.loads(header)
+            if meta['expires'] < time.time():
+                return None
+            tags = list(meta['tags'])
+            if self.store.versions(tags) != [meta['tags'][tag] for tag in tags]:
+                return None
+        except STORE_ERRORS as e:
+            current_app.logger.warning(f'Page cache lookup failed: {e}')
+            return None
+        return current_app.response_class(body, status=meta['status'], headers=meta['headers'])
+
+    def writes(self):
+        """Purge counter to compare before and after rendering, or None"""
+        try:
+            return self.store.versions([WRITES_TAG])[0]
+        except STORE_ERRORS as e:
+            current_app.logger.warning(f'Page cache unavailable: {e}')
+            return None
+
+    def save(self, key, response, tags, writes):
+        """Store a response unless a purge happened since ``writes`` was read"""
+        tags = sorted(tags)
+        try:
+            versions = self.store.versions(tags) if tags else []
+            # Versions first, then the purge counter, which purges bump
+            # first: a purge we missed means the page is already stale
+            if self.writes() != writes:
+                return
+            meta = {
+                'status': response.status_code,
+                'headers': [
+                    [name, value] for name, value in response.headers.items()
+                    if name.lower() not in UNCACHED_HEADERS
+                ],
+                'tags': dict(zip(tags, versions)),
+                'expires': time.time() + self.ttl
+            }
+            self.store.set(key, json.dumps(meta).encode() + b'\n' + response.get_data(), self.ttl)
+        except STORE_ERRORS as e:
+            current_app.logger.warning(f'Page cache store failed: {e}')
+
+    def purge(self, tags):
+        """Invalidate every page tagged with any of ``tags``"""
+        try:
+            self.store.bump([WRITES_TAG])
+            self.store.bump(sorted(tags))
+        except STORE_ERRORS as e:
+            current_app.logger.error(f'Page cache purge failed: {e}')
+
+def init_page_cache(app):
+    """Set up the page cache if ``PAGE_CACHE`` names a store"""
+    name = app.config.get('PAGE_CACHE')
+    if not name:
+        return
+    if name not in STORES:
+        raise ValueError(f'Unknown page cache store: {name}')
+    app.extensions['page_cache'] = PageCache(STORES[name](app), app.config.setdefault('PAGE_CACHE_TTL', 300))
+
+def tag_page(*tags):
+    """Tag the page being rendered so it is purged along with ``tags``"""
+    if 'page_tags' in g:
+        g.page_tags.update(tags)
+
+def _anonymous_request():
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # Check the session first so logged-in users are never loaded for this
+    if '_flashes' in session or '_user_id' in session:
+        return False
+    return not current_user.is_authenticated
+
+def _cacheable_response(response):
+    if response.status_code != 200 or response.is_streamed:
+        return False
+    if 'Set-Cookie' in response.headers:
+        return False
+    if response.cache_control.private or response.cache_control.no_store:
+        return False
+    # Anything stored in the session while rendering (a CSRF token, a flash)
+    # means the page was made for this visitor; the bookkeeping flags set
+    # by Flask and Flask-Login for anonymous visitors don't count
+    return set(session) <= SESSION_FLAGS
+
+def _page_key(query_args):
+    # Pages link with relative URLs, so the key leaves out the Host header,
+    # which any client can set to anything
+    args = []
+    for name in sorted(query_args):
+        if name not in request.args:
+            continue
+        value = request.args[name]
+        normalize = query_args[name] if isinstance(query_args, dict) else None
+        if normalize is not None:
+            value = normalize(value)
+            if value is None:
+                continue
+        args.append((name, value))
+    return f'{request.path}?{urlencode(args)}'
+
+def cached_page(*tags, query_args=()):
+    """Serve a view from the page cache for anonymous visitors
+
+    ``tags`` apply to every page of the view; :func:`tag_page` adds more
+    while rendering. Only the named ``query_args`` are part of the cache key.
+    Given as a dict, each value is a function returning the canonical form of
+    the argument, or None when the view would ignore it, so junk values share
+    the key of the page they actually render.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = current_app.extensions.get('page_cache')
+            if cache is None or not _anonymous_request():
+                return view(*args, **kwargs)
+
+            key = _page_key(query_args)
+            response = cache.load(key)
+            if response is not None:
+                response.headers['X-Page-Cache'] = 'hit'
+                return response
+
+            writes = cache.writes()
+            g.page_tags = set(tags)
+            # The page is stored under the tag versions read above, so render
+            # it from the primary rather than a replica that may lag behind them
+            with on_primary():
+                response = make_response(view(*args, **kwargs))
+            if writes is not None and _cacheable_response(response):
+                cache.save(key, response, g.page_tags, writes)
+            response.headers['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
+
+@posts_committed.connect
+def _purge_posts(app, changes):
+    cache = app.extensions.get('page_cache')
+    if cache is not None:
+        tags = {LISTING_TAG} | {post_tag(state.id) for state in changes}
+        # Unpublished and deleted posts purge their neighbours through their own tag
+        if any(state.is_published and not state.deleted for state in changes):
+            tags.add(ARCHIVE_TAG)
+        cache.purge(tags)
+
+@comments_committed.connect
+def _purge_comments(app, post_ids):
+    cache = app.extensions.get('page_cache')
+    if cache is not None:
+        # Listings show comment counts too
+        cache.purge({LISTING_TAG} | {post_tag(post_id) for post_id in post_ids})
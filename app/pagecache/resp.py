@@ -0,0 +1,90 @@
+"""Minimal client for the Redis serialization protocol (RESP)
+
+Only what the page cache needs, so Redis (or anything speaking its
+protocol, such as Valkey or KeyDB) can be used without an extra dependency.
+"""
+import socket
+import threading
+from urllib.parse import urlparse
+
+class RespError(Exception):
+    """Error reply sent by the server"""
+
+class RespClient:
+    """Thread-safe RESP client keeping one connection per thread"""
+
+    def __init__(self, host='localhost', port=6379, db=0, timeout=0.5):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """Build a client from a ``redis://host:port/db`` URL"""
+        parts = urlparse(url)
+        db = int(parts.path.lstrip('/') or 0)
+        return cls(parts.hostname or 'localhost', parts.port or 6379, db, **kwargs)
+
+    def execute(self, *args):
+        """Send one command and return its decoded reply"""
+        conn = self._connection()
+        try:
+            conn.sendall(self._encode(args))
+            return self._read(self._local.reader)
+        except (OSError, ValueError):
+            self.close()
+            raise
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = self._local.reader = None
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self._local.conn = conn
+            self._local.reader = conn.makefile('rb')
+            if self.db:
+                self.execute('SELECT', self.db)
+        return conn
+
+    @staticmethod
+    def _encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read(self, reader):
+        line = reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ValueError('Connection closed mid-reply')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RespError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            size = int(rest)
+            if size < 0:
+                return None
+            data = reader.read(size + 2)
+            return data[:-2]
+        if kind == b'*':
+            size = int(rest)
+            if size < 0:
+                return None
+            return [self._read(reader) for _ in range(size)]
+        raise ValueError(f'Unexpected reply: {line!r}')
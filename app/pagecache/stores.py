@@ -0,0 +1,190 @@
+"""Storage backends for the page cache
+
+A store keeps opaque page entries and a version counter per tag. Bumping
+a tag's version is how pages are purged: entries remember the versions they
+were rendered under and are ignored once any of them has moved on.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from app.pagecache.resp import RespClient, RespError
+from app.utils.cache import LRUCache
+from app.utils.runtime import file_lock, runtime_path
+
+class PageStore:
+    """Interface shared by the page cache stores"""
+    name = None
+
+    def __init__(self, app):
+        self.app = app
+
+    def get(self, key):
+        """Return the entry stored under ``key``, or None"""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        """Store an entry for ``ttl`` seconds"""
+        raise NotImplementedError
+
+    def versions(self, tags):
+        """Return the current version of each tag"""
+        raise NotImplementedError
+
+    def bump(self, tags):
+        """Advance the version of each tag"""
+        raise NotImplementedError
+
+class TagTable:
+    """Tag versions in an mmap'd table of counters shared by every worker
+
+    Tags are hashed into a fixed number of slots, so two tags may share a
+    slot; that only ever purges a few extra pages.
+    """
+    SLOTS = 4096
+    SLOT = struct.Struct('<Q')
+
+    def __init__(self, path):
+        self.path = path
+        size = self.SLOTS * self.SLOT.size
+        with file_lock(f'{path}.lock'):
+            with open(path, 'a+b') as handle:
+                if os.fstat(handle.fileno()).st_size < size:
+                    handle.truncate(size)
+                self._map = mmap.mmap(handle.fileno(), size)
+
+    def versions(self, tags):
+        return [self.SLOT.unpack_from(self._map, self._offset(tag))[0] for tag in tags]
+
+    def bump(self, tags):
+        with file_lock(f'{self.path}.lock'):
+            for tag in tags:
+                offset = self._offset(tag)
+                self.SLOT.pack_into(self._map, offset, self.SLOT.unpack_from(self._map, offset)[0] + 1)
+
+    def _offset(self, tag):
+        return zlib.crc32(tag.encode()) % self.SLOTS * self.SLOT.size
+
+class MemoryStore(PageStore):
+    """Per-process LRU of pages, purged through tag versions shared by every worker"""
+    name = 'memory'
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._entries = LRUCache(app.config.get('PAGE_CACHE_SIZE', 1024))
+        # A purge committed in any worker must reach the pages cached in all of them
+        self._tags = TagTable(runtime_path(app, 'page-tags'))
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, value, ttl):
+        self._entries.set(key, value)
+
+    def versions(self, tags):
+        return self._tags.versions(tags)
+
+    def bump(self, tags):
+        self._tags.bump(tags)
+
+class FilesystemStore(PageStore):
+    """Entries as files in a shared directory, tag versions in a :class:`TagTable`
+
+    Every worker sweeps the directory now and then, deleting pages past their
+    TTL and then the oldest ones past ``PAGE_CACHE_MAX_FILES``.
+    """
+    name = 'filesystem'
+    # Seconds between sweeps in each worker
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.directory = app.config.get('PAGE_CACHE_DIR') or runtime_path(app, 'pages')
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_files = app.config.get('PAGE_CACHE_MAX_FILES', 10000)
+        self._tags = TagTable(os.path.join(self.directory, 'tags'))
+        self._next_sweep = 0
+        self._writes = 0
+
+    def get(self, key):
+        try:
+            with open(self._entry_path(key), 'rb') as handle:
+                return handle.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value, ttl):
+        path = self._entry_path(key)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as handle:
+            handle.write(value)
+        os.replace(tmp, path)
+
+        # Sweep on a timer, or sooner if this worker alone wrote a tenth of the cap
+        self._writes += 1
+        now = time.time()
+        if now >= self._next_sweep or self._writes * 10 >= self.max_files:
+            self._next_sweep = now + self.SWEEP_INTERVAL
+            self._writes = 0
+            self.sweep(ttl, now)
+
+    def sweep(self, ttl, now=None):
+        """Delete expired pages and leftovers, then the oldest pages past the cap"""
+        now = time.time() if now is None else now
+        pages = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(('.page', '.tmp')):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+                if mtime + ttl < now or (entry.name.endswith('.tmp') and mtime + 60 < now):
+                    os.unlink(entry.path)
+                elif entry.name.endswith('.page'):
+                    pages.append((mtime, entry.path))
+            except FileNotFoundError:
+                # Another worker got there first
+                continue
+        pages.sort()
+        for _, path in pages[:max(len(pages) - self.max_files, 0)]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+
+    def versions(self, tags):
+        return self._tags.versions(tags)
+
+    def bump(self, tags):
+        self._tags.bump(tags)
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.page')
+
+class RedisStore(PageStore):
+    """Entries and tag versions in Redis, shared by every host"""
+    name = 'redis'
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.client = RespClient.from_url(app.config.get('PAGE_CACHE_URL') or 'redis://localhost:6379/0')
+        self.prefix = app.config.get('PAGE_CACHE_PREFIX', 'hexblog:')
+
+    def get(self, key):
+        return self.client.execute('GET', f'{self.prefix}page:{key}')
+
+    def set(self, key, value, ttl):
+        self.client.execute('SET', f'{self.prefix}page:{key}', value, 'EX', int(ttl))
+
+    def versions(self, tags):
+        values = self.client.execute('MGET', *(f'{self.prefix}tag:{tag}' for tag in tags))
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump(self, tags):
+        for tag in tags:
+            self.client.execute('INCR', f'{self.prefix}tag:{tag}')
+
+# Errors a store may raise when its backing service is unavailable
+STORE_ERRORS = (OSError, ValueError, RespError)
@@ -0,0 +1,121 @@
+"""Pluggable full-text search for blog posts
+
+The backend is picked with the ``SEARCH_BACKEND`` setting. ``auto`` uses
+SQLite FTS5 or Postgres tsvector when the database supports it and falls
+back to the in-process inverted index otherwise. ``like`` keeps the old
+ILIKE scan around as a baseline.
+
+Result pages are kept in a small LRU cache tagged with the ``content``
+generation, so repeated searches skip the backend until a post changes.
+"""
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.engine import make_url
+from app.models.signals import posts_flushed, posts_committed
+from app.search.like import LikeBackend
+from app.search.memory import MemoryBackend
+from app.search.fts import SqliteFTSBackend, PostgresFTSBackend, fts5_available
+from app.search.suggest import TitleSuggester
+from app.utils.cache import LRUCache, generation
+from app.utils.database import on_primary
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (LikeBackend, MemoryBackend, SqliteFTSBackend, PostgresFTSBackend)
+}
+
+search_cli = AppGroup('search', help='Manage the post search index.')
+
+def _auto_backend(app):
+    """Pick the best backend the configured database supports"""
+    dialect = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if dialect == 'sqlite' and fts5_available():
+        return SqliteFTSBackend.name
+    if dialect == 'postgresql':
+        return PostgresFTSBackend.name
+    return MemoryBackend.name
+
+def init_search(app):
+    """Set up the configured search backend for the app"""
+    name = app.config.setdefault('SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        name = _auto_backend(app)
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown search backend: {name}')
+
+    app.extensions['search'] = BACKENDS[name](app)
+    app.extensions['suggest'] = TitleSuggester()
+    app.extensions['search_cache'] = LRUCache(
+        app.config.setdefault('SEARCH_CACHE_SIZE', 512),
+        app.config.setdefault('SEARCH_CACHE_TTL', 300)
+    )
+    app.config.setdefault('SEARCH_SUGGEST_LIMIT', 8)
+    app.cli.add_command(search_cli)
+
+def get_backend():
+    """Return the search backend of the current app"""
+    return current_app.extensions['search']
+
+def normalize_query(query):
+    """Reduce a query to the form used as its cache key"""
+    return ' '.join(query.lower().split())
+
+def search_posts(query, page=1, per_page=10):
+    """Search published posts, returning one page of ranked results"""
+    cache = current_app.extensions['search_cache']
+    key = (normalize_query(query), page, per_page)
+    # Read the generation before querying so a post committed meanwhile
+    # can only make the stored page look older than it is, never newer
+    current = generation('content')
+    cached = cache.get(key)
+    if cached is not None and cached[0] == current:
+        return cached[1]
+
+    with on_primary():
+        results = get_backend().search(query, page=page, per_page=per_page)
+    cache.set(key, (current, results))
+    return results
+
+def suggest_titles(prefix, limit=None):
+    """Return ``(title, slug)`` pairs of published posts matching a prefix"""
+    suggester = current_app.extensions['suggest']
+    current = generation('content')
+    if not suggester.loaded or suggester.generation != current:
+        with on_primary():
+            suggester.load(current)
+    return suggester.suggest(prefix, limit or current_app.config['SEARCH_SUGGEST_LIMIT'])
+
+@posts_flushed.connect
+def _index_flushed_posts(app, session, changes):
+    backend = app.extensions.get('search')
+    if backend is not None:
+        backend.index(session, changes)
+
+@posts_committed.connect
+def _apply_committed_posts(app, changes):
+    backend = app.extensions.get('search')
+    if backend is not None:
+        backend.apply(changes)
+
+    suggester = app.extensions.get('suggest')
+    if suggester is not None and suggester.loaded:
+        # Patch the titles in place when this commit is the only change since
+        # the last load; otherwise another worker got there too and the next
+        # lookup reloads
+        current = app.extensions['generations'].current('content')
+        if current != suggester.generation + 1:
+            return
+        for state in changes:
+            if state.is_published and not state.deleted:
+                suggester.add(state.id, state.title, state.slug, state.published_at)
+            else:
+                suggester.remove(state.id)
+        suggester.generation = current
+
+@search_cli.command('reindex')
+def reindex_command():
+    """Rebuild the search index from the post table."""
+    backend = get_backend()
+    backend.rebuild()
+    click.echo(f'Rebuilt the {backend.name} search index ✨')
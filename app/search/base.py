@@ -0,0 +1,161 @@
+"""Common pieces shared by the search backends"""
+import re
+from bisect import bisect_left
+from datetime import timezone
+from math import ceil
+from markupsafe import Markup, escape
+from app import db
+from app.models.post import Post
+from app.utils.text import tokenize
+
+# Markers wrapped around matches by the database, swapped for <mark> tags
+# once the rest of the snippet has been escaped
+MATCH_OPEN = '\x02'
+MATCH_CLOSE = '\x03'
+
+SNIPPET_WORDS = 30
+
+_WORD_RE = re.compile(r'\w+')
+
+class SearchHit:
+    """A search result carrying only what the results page shows"""
+    __slots__ = ('id', 'title', 'slug', 'published_at', 'snippet')
+
+    def __init__(self, id, title, slug, published_at, snippet):
+        self.id = id
+        self.title = title
+        self.slug = slug
+        self.published_at = published_at
+        self.snippet = snippet
+
+    def __repr__(self):
+        return f'<SearchHit {self.title}>'
+
+class SearchPage:
+    """One page of search results, shaped like a Flask-SQLAlchemy pagination"""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def pages(self):
+        if not self.total:
+            return 0
+        return ceil(self.total / self.per_page)
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+class SearchBackend:
+    """Interface implemented by every search backend
+
+    ``search`` returns a :class:`SearchPage` of :class:`SearchHit` objects,
+    each with a highlighted snippet, so result pages never load post bodies.
+
+    ``index`` runs inside the flush that changed posts and may write to the
+    same transaction. ``apply`` runs after the transaction commits and is
+    where in-process indexes pick up the change.
+    """
+    name = None
+
+    def __init__(self, app):
+        self.app = app
+
+    def search(self, query, page=1, per_page=10):
+        raise NotImplementedError
+
+    def index(self, session, changes):
+        """Sync changed posts inside the open transaction"""
+
+    def apply(self, changes):
+        """Sync changed posts once their transaction has committed"""
+
+    def rebuild(self):
+        """Rebuild the index from the post table"""
+
+    @staticmethod
+    def terms(query):
+        """Tokenize a user query"""
+        return tokenize(query)
+
+def stamp(value):
+    """Turn a stored datetime into a UTC timestamp"""
+    if value is None:
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def highlight(marked):
+    """Escape a snippet marked with MATCH_OPEN/MATCH_CLOSE and add <mark> tags"""
+    if not marked:
+        return Markup('')
+    return Markup(str(escape(marked)).replace(MATCH_OPEN, '<mark>').replace(MATCH_CLOSE, '</mark>'))
+
+def make_snippet(text, terms, width=SNIPPET_WORDS):
+    """Highlight the run of ``width`` words with the most matches of ``terms``
+
+    Terms match as prefixes, the same way the backends match them.
+    """
+    words = list(_WORD_RE.finditer(text or ''))
+    if not words:
+        return Markup('')
+
+    prefixes = tuple(terms)
+    hits = [i for i, word in enumerate(words) if prefixes and word.group().lower().startswith(prefixes)]
+    start = 0
+    if hits:
+        best = max(hits, key=lambda i: bisect_left(hits, i + width) - bisect_left(hits, i))
+        start = max(best - 3, 0)
+    end = min(start + width, len(words)) - 1
+
+    pieces = ['… '] if start else []
+    cursor = words[start].start()
+    for i in hits:
+        if start <= i <= end:
+            word = words[i]
+            pieces.append(text[cursor:word.start()])
+            pieces.append(MATCH_OPEN + word.group() + MATCH_CLOSE)
+            cursor = word.end()
+    pieces.append(text[cursor:words[end].end()])
+    if words[end].end() < len(text.rstrip()):
+        pieces.append(' …')
+    return highlight(''.join(pieces))
+
+def hits_in_order(ids, snippets):
+    """Build hits for ``ids`` in order, reading titles but never post bodies"""
+    if not ids:
+        return []
+    rows = db.session.query(Post.id, Post.title, Post.slug, Post.published_at)\
+        .filter(Post.id.in_(ids))
+    found = {row.id: row for row in rows}
+    return [
+        SearchHit(post_id, found[post_id].title, found[post_id].slug,
+                  found[post_id].published_at, snippets.get(post_id, Markup('')))
+        for post_id in ids if post_id in found
+    ]
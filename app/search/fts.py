@@ -0,0 +1,164 @@
+"""Full-text search backed by SQLite FTS5 or PostgreSQL tsvector"""
+import sqlite3
+from functools import lru_cache
+from sqlalchemy import event, text
+from app import db
+from app.models.post import Post
+from app.search.base import (
+    MATCH_CLOSE, MATCH_OPEN, SNIPPET_WORDS, SearchBackend, SearchHit, SearchPage, highlight
+)
+from app.utils.text import html_to_text
+
+FTS_TABLE = 'post_fts'
+
+# Only published posts live in the FTS table; its rowid is the post id
+SQLITE_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    "USING fts5(title, body, tokenize='porter unicode61')"
+)
+
+# Title matches weigh ten times as much as body matches
+SQLITE_RANK = f'bm25({FTS_TABLE}, 10.0, 1.0)'
+
+POSTGRES_DOCUMENT = (
+    "(setweight(to_tsvector('english', coalesce(post.title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(post.content, '')), 'B'))"
+)
+
+POSTGRES_SCHEMA = (
+    f"CREATE INDEX IF NOT EXISTS ix_post_search ON post USING gin ({POSTGRES_DOCUMENT})"
+)
+
+HEADLINE_OPTIONS = (
+    f'StartSel="{MATCH_OPEN}", StopSel="{MATCH_CLOSE}", '
+    f'MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}, ShortWord=2'
+)
+
+REBUILD_BATCH_SIZE = 500
+
+@lru_cache(maxsize=None)
+def fts5_available():
+    """Check whether the sqlite3 library was compiled with FTS5"""
+    conn = sqlite3.connect(':memory:')
+    try:
+        conn.execute('CREATE VIRTUAL TABLE probe USING fts5(body)')
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+    return True
+
+def match_expression(terms):
+    """Build an FTS5 MATCH expression requiring every term as a prefix"""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+class SqliteFTSBackend(SearchBackend):
+    """BM25-ranked search over an FTS5 virtual table"""
+    name = 'sqlite-fts'
+
+    def search(self, query, page=1, per_page=10):
+        terms = self.terms(query)
+        if not terms:
+            return SearchPage([], page, per_page, 0)
+
+        params = {'q': match_expression(terms)}
+        total = db.session.execute(
+            text(f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q'),
+            params
+        ).scalar()
+        ranked = text(
+            f'SELECT post.id, post.title, post.slug, post.published_at, '
+            f"snippet({FTS_TABLE}, 1, :open, :close, '…', {SNIPPET_WORDS}) "
+            f'FROM {FTS_TABLE} JOIN post ON post.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH :q '
+            f'ORDER BY {SQLITE_RANK} LIMIT :limit OFFSET :offset'
+        ).columns(published_at=db.DateTime)
+        rows = db.session.execute(ranked, dict(
+            params, open=MATCH_OPEN, close=MATCH_CLOSE,
+            limit=per_page, offset=(page - 1) * per_page
+        ))
+        items = [
+            SearchHit(post_id, title, slug, published_at, highlight(snippet))
+            for post_id, title, slug, published_at, snippet in rows
+        ]
+        return SearchPage(items, page, per_page, total)
+
+    def index(self, session, changes):
+        conn = session.connection()
+        for state in changes:
+            conn.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': state.id})
+            if state.is_published and not state.deleted:
+                conn.execute(
+                    text(f'INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (:id, :title, :body)'),
+                    {'id': state.id, 'title': state.title, 'body': html_to_text(state.content)}
+                )
+
+    def rebuild(self):
+        db.session.execute(text(f'DELETE FROM {FTS_TABLE}'))
+        posts = db.session.query(Post.id, Post.title, Post.content).filter(
+            Post.is_published == True,
+            Post.published_at.isnot(None)
+        ).execution_options(yield_per=REBUILD_BATCH_SIZE)
+
+        insert = text(f'INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (:id, :title, :body)')
+        batch = []
+        for post_id, title, content in posts:
+            batch.append({'id': post_id, 'title': title, 'body': html_to_text(content)})
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                db.session.execute(insert, batch)
+                batch = []
+        if batch:
+            db.session.execute(insert, batch)
+        db.session.commit()
+
+class PostgresFTSBackend(SearchBackend):
+    """Ranked search over a GIN-indexed tsvector expression
+
+    The index is an expression index on the post table itself, so Postgres
+    keeps it in sync and there is nothing to do on flush.
+    """
+    name = 'postgres'
+
+    def search(self, query, page=1, per_page=10):
+        if not self.terms(query):
+            return SearchPage([], page, per_page, 0)
+
+        matches = (
+            f"FROM post, websearch_to_tsquery('english', :q) AS query "
+            f"WHERE post.is_published AND post.published_at IS NOT NULL "
+            f"AND {POSTGRES_DOCUMENT} @@ query"
+        )
+        total = db.session.execute(text(f'SELECT count(*) {matches}'), {'q': query}).scalar()
+        rows = db.session.execute(
+            text(f'SELECT post.id, post.title, post.slug, post.published_at, '
+                 f"ts_headline('english', regexp_replace(post.content, '<[^>]+>', ' ', 'g'), "
+                 f'query, :options) '
+                 f'{matches} '
+                 f'ORDER BY ts_rank_cd({POSTGRES_DOCUMENT}, query) DESC, post.published_at DESC '
+                 f'LIMIT :limit OFFSET :offset'),
+            {'q': query, 'options': HEADLINE_OPTIONS,
+             'limit': per_page, 'offset': (page - 1) * per_page}
+        )
+        items = [
+            SearchHit(post_id, title, slug, published_at, highlight(snippet))
+            for post_id, title, slug, published_at, snippet in rows
+        ]
+        return SearchPage(items, page, per_page, total)
+
+    def rebuild(self):
+        db.session.execute(text('REINDEX INDEX ix_post_search'))
+        db.session.commit()
+
+@event.listens_for(Post.__table__, 'after_create')
+def _create_search_schema(target, connection, **kw):
+    """Create the full-text index alongside the post table"""
+    if connection.dialect.name == 'sqlite' and fts5_available():
+        connection.exec_driver_sql(SQLITE_SCHEMA)
+    elif connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(POSTGRES_SCHEMA)
+
+@event.listens_for(Post.__table__, 'before_drop')
+def _drop_search_schema(target, connection, **kw):
+    """Drop the FTS5 table before the post table goes away"""
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {FTS_TABLE}')
@@ -0,0 +1,380 @@
+"""Pure-Python inverted index with a memory-mapped snapshot
+
+Each term maps to a posting list of packed arrays: the document numbers, a
+frequency word (title hits in the high 16 bits, body hits in the low 16) and
+the token positions of every hit. Documents are numbered in the order they
+are indexed, so appending keeps every list sorted. Re-indexing or removing a
+post only tombstones its old number; dead entries are dropped when the
+snapshot is compacted.
+
+The plain text of each body is kept zlib-compressed next to the postings so
+result snippets can be cut without going back to the post table.
+
+The snapshot is a flat binary file that new workers open with mmap. Only the
+header, the document table and the term directory are parsed up front; a
+term's posting list is decoded the first time something touches it and body
+text is only decompressed for the hits being shown.
+"""
+import math
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from app.utils.text import tokenize
+
+MAGIC = b'HEXIDX\x00\x02'
+BYTEORDER = 0 if sys.byteorder == 'little' else 1
+
+# magic, byte order, next docno, dead docs, doc count, term count, total length
+HEADER = struct.Struct('<8sBxxxIIIIQ')
+# post id, docno, length, title length, stamp, text offset, text size
+DOC = struct.Struct('<IIIIdQI')
+# term size in bytes, entries, positions, offset of the posting arrays
+TERM = struct.Struct('<HIIQ')
+
+ITEM_SIZE = 4
+FIELD_MAX = 0xFFFF
+
+# BM25 parameters; a title hit counts as TITLE_WEIGHT body hits
+K1 = 1.2
+B = 0.75
+TITLE_WEIGHT = 3
+MAX_PREFIX_TERMS = 50
+
+Doc = namedtuple('Doc', 'docno length title_length stamp')
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file cannot be used"""
+
+class Postings:
+    """Posting list for a single term"""
+    __slots__ = ('docs', 'freqs', 'starts', 'positions')
+
+    def __init__(self):
+        self.docs = array('I')
+        self.freqs = array('I')
+        self.starts = array('I')
+        self.positions = array('I')
+
+    def __len__(self):
+        return len(self.docs)
+
+    def arrays(self):
+        return self.docs, self.freqs, self.starts, self.positions
+
+    def append(self, docno, title_tf, body_tf, positions):
+        self.docs.append(docno)
+        self.freqs.append(min(title_tf, FIELD_MAX) << 16 | min(body_tf, FIELD_MAX))
+        self.starts.append(len(self.positions))
+        self.positions.extend(positions)
+
+    def find(self, docno):
+        """Index of ``docno`` in this list, or None"""
+        i = bisect_left(self.docs, docno)
+        if i < len(self.docs) and self.docs[i] == docno:
+            return i
+        return None
+
+    def positions_at(self, i):
+        end = self.starts[i + 1] if i + 1 < len(self.starts) else len(self.positions)
+        return self.positions[self.starts[i]:end]
+
+    def compacted(self, live):
+        """Copy of this list without entries for dead documents"""
+        kept = Postings()
+        for i, docno in enumerate(self.docs):
+            if docno in live:
+                kept.docs.append(docno)
+                kept.freqs.append(self.freqs[i])
+                kept.starts.append(len(kept.positions))
+                kept.positions.extend(self.positions_at(i))
+        return kept
+
+    @staticmethod
+    def extent(entries, positions):
+        """Size in bytes of a serialized list"""
+        return (3 * entries + positions) * ITEM_SIZE
+
+    @classmethod
+    def from_buffer(cls, buffer, offset, entries, positions):
+        postings = cls()
+        counts = (entries, entries, entries, positions)
+        for values, count in zip(postings.arrays(), counts):
+            end = offset + count * ITEM_SIZE
+            values.frombytes(buffer[offset:end])
+            offset = end
+        return postings
+
+class InvertedIndex:
+    """Positional inverted index over post titles and bodies"""
+
+    def __init__(self):
+        self.docs = {}          # post id -> Doc
+        self._live = {}         # docno -> post id
+        self._postings = {}     # term -> decoded Postings
+        self._lazy = {}         # term -> (offset, entries, positions) in the snapshot
+        self._texts = {}        # post id -> compressed body text
+        self._text_refs = {}    # post id -> (offset, size) in the snapshot
+        self._buffer = None
+        self._vocabulary = None
+        self._next_docno = 0
+        self._dead = 0
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, post_id):
+        return post_id in self.docs
+
+    def add(self, post_id, title, body, stamp=0.0):
+        """Index a post, replacing any earlier version of it"""
+        self.remove(post_id)
+
+        title_tokens = tokenize(title)
+        body_tokens = tokenize(body)
+        title_length = len(title_tokens)
+
+        # Body positions start one past the title so phrases never span both
+        hits = {}
+        for position, term in enumerate(title_tokens):
+            hits.setdefault(term, []).append(position)
+        for position, term in enumerate(body_tokens, title_length + 1):
+            hits.setdefault(term, []).append(position)
+
+        docno = self._next_docno
+        self._next_docno += 1
+        for term, positions in hits.items():
+            title_tf = bisect_left(positions, title_length)
+            self._load(term, create=True).append(docno, title_tf, len(positions) - title_tf, positions)
+
+        length = title_length + len(body_tokens)
+        self.docs[post_id] = Doc(docno, length, title_length, stamp)
+        self._live[docno] = post_id
+        self._texts[post_id] = zlib.compress(body.encode())
+        self._total_length += length
+
+    def remove(self, post_id):
+        """Drop a post from the index"""
+        doc = self.docs.pop(post_id, None)
+        if doc is None:
+            return
+        del self._live[doc.docno]
+        self._texts.pop(post_id, None)
+        self._text_refs.pop(post_id, None)
+        self._total_length -= doc.length
+        self._dead += 1
+
+    def text(self, post_id):
+        """Plain body text of an indexed post"""
+        compressed = self._texts.get(post_id)
+        if compressed is None:
+            offset, size = self._text_refs[post_id]
+            compressed = self._buffer[offset:offset + size]
+        return zlib.decompress(compressed).decode()
+
+    def search(self, terms, phrases=()):
+        """Rank posts matching every term and phrase
+
+        ``terms`` match as prefixes, while the words of each phrase must
+        appear exactly and next to each other. Returns ``(post_id, score)``
+        pairs, best first.
+        """
+        required = [(term, True) for term in terms]
+        required += [(word, False) for phrase in phrases for word in phrase]
+        if not required or not self.docs:
+            return []
+
+        count = len(self.docs)
+        average = self._total_length / count or 1
+        scores = None
+        for term, prefix in required:
+            weights = {}
+            for candidate in (self._expand(term) if prefix else (term,)):
+                postings = self._load(candidate)
+                if postings is None:
+                    continue
+                for docno, freq in zip(postings.docs, postings.freqs):
+                    if docno in self._live:
+                        weights[docno] = weights.get(docno, 0) + (freq >> 16) * TITLE_WEIGHT + (freq & FIELD_MAX)
+
+            idf = math.log(1 + (count - len(weights) + 0.5) / (len(weights) + 0.5))
+            matched = {}
+            for docno, tf in weights.items():
+                if scores is not None and docno not in scores:
+                    continue
+                length = self.docs[self._live[docno]].length
+                score = idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average))
+                matched[docno] = score + (scores[docno] if scores is not None else 0.0)
+            scores = matched
+            if not scores:
+                return []
+
+        for phrase in phrases:
+            scores = {docno: score for docno, score in scores.items() if self._has_phrase(docno, phrase)}
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [(self._live[docno], score) for docno, score in ranked]
+
+    def compact(self):
+        """Drop posting entries that belong to removed documents"""
+        for term in list(self._lazy):
+            self._load(term)
+        for term, postings in list(self._postings.items()):
+            kept = postings.compacted(self._live)
+            if kept:
+                self._postings[term] = kept
+            else:
+                del self._postings[term]
+        self._dead = 0
+        self._vocabulary = None
+
+    def save(self, path):
+        """Atomically write the index to ``path``"""
+        if self._dead > len(self.docs) // 4:
+            self.compact()
+
+        terms = sorted(set(self._postings) | set(self._lazy))
+        encoded = [term.encode() for term in terms]
+        extents = [self._extent(term) for term in terms]
+
+        directory_size = sum(TERM.size + len(raw) for raw in encoded)
+        postings_start = HEADER.size + len(self.docs) * DOC.size + directory_size
+        text_offset = postings_start + sum(Postings.extent(*extent) for extent in extents)
+
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, BYTEORDER, self._next_docno, self._dead,
+                                  len(self.docs), len(terms), self._total_length))
+            for post_id, doc in self.docs.items():
+                size = self._text_size(post_id)
+                out.write(DOC.pack(post_id, *doc, text_offset, size))
+                text_offset += size
+
+            offset = postings_start
+            for raw, (entries, positions) in zip(encoded, extents):
+                out.write(TERM.pack(len(raw), entries, positions, offset))
+                out.write(raw)
+                offset += Postings.extent(entries, positions)
+
+            for term, (entries, positions) in zip(terms, extents):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    for values in postings.arrays():
+                        out.write(values.tobytes())
+                else:
+                    start = self._lazy[term][0]
+                    out.write(self._buffer[start:start + Postings.extent(entries, positions)])
+
+            for post_id in self.docs:
+                compressed = self._texts.get(post_id)
+                if compressed is None:
+                    start, size = self._text_refs[post_id]
+                    compressed = self._buffer[start:start + size]
+                out.write(compressed)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Open a snapshot written by :meth:`save`"""
+        with open(path, 'rb') as handle:
+            try:
+                buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise SnapshotError(f'Empty snapshot {path}') from e
+
+        try:
+            (magic, byteorder, next_docno, dead, doc_count,
+             term_count, total_length) = HEADER.unpack_from(buffer, 0)
+            if magic != MAGIC or byteorder != BYTEORDER:
+                raise SnapshotError(f'Incompatible snapshot {path}')
+
+            index = cls()
+            index._next_docno = next_docno
+            index._dead = dead
+            index._total_length = total_length
+
+            offset = HEADER.size
+            for _ in range(doc_count):
+                (post_id, docno, length, title_length, stamp,
+                 text_offset, text_size) = DOC.unpack_from(buffer, offset)
+                offset += DOC.size
+                index.docs[post_id] = Doc(docno, length, title_length, stamp)
+                index._live[docno] = post_id
+                index._text_refs[post_id] = (text_offset, text_size)
+
+            for _ in range(term_count):
+                size, entries, positions, start = TERM.unpack_from(buffer, offset)
+                offset += TERM.size
+                term = buffer[offset:offset + size].decode()
+                offset += size
+                index._lazy[term] = (start, entries, positions)
+        except (struct.error, UnicodeDecodeError) as e:
+            buffer.close()
+            raise SnapshotError(f'Corrupt snapshot {path}') from e
+        except SnapshotError:
+            buffer.close()
+            raise
+
+        index._buffer = buffer
+        return index
+
+    def _load(self, term, create=False):
+        """Posting list for ``term``, decoding it from the snapshot if needed"""
+        postings = self._postings.get(term)
+        if postings is None:
+            location = self._lazy.pop(term, None)
+            if location is not None:
+                postings = Postings.from_buffer(self._buffer, *location)
+            elif create:
+                postings = Postings()
+                self._vocabulary = None
+            else:
+                return None
+            self._postings[term] = postings
+        return postings
+
+    def _extent(self, term):
+        postings = self._postings.get(term)
+        if postings is not None:
+            return len(postings), len(postings.positions)
+        _, entries, positions = self._lazy[term]
+        return entries, positions
+
+    def _text_size(self, post_id):
+        compressed = self._texts.get(post_id)
+        if compressed is not None:
+            return len(compressed)
+        return self._text_refs[post_id][1]
+
+    def _expand(self, prefix):
+        """Indexed terms starting with ``prefix``"""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(set(self._postings) | set(self._lazy))
+        vocabulary = self._vocabulary
+        i = bisect_left(vocabulary, prefix)
+        expanded = []
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix) and len(expanded) < MAX_PREFIX_TERMS:
+            expanded.append(vocabulary[i])
+            i += 1
+        return expanded
+
+    def _has_phrase(self, docno, phrase):
+        """Check that the words of ``phrase`` appear in order in a document"""
+        hits = []
+        for word in phrase:
+            postings = self._load(word)
+            i = postings.find(docno) if postings is not None else None
+            if i is None:
+                return False
+            hits.append(set(postings.positions_at(i)))
+        return any(
+            all(start + offset in positions for offset, positions in enumerate(hits[1:], 1))
+            for start in hits[0]
+        )
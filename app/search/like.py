@@ -0,0 +1,34 @@
+"""Substring search using ILIKE, for databases without a full-text index"""
+from app import db
+from app.models.post import Post
+from app.search.base import SearchBackend, SearchHit, SearchPage, make_snippet
+from app.utils.text import html_to_text
+
+class LikeBackend(SearchBackend):
+    """Scan post titles and bodies with ILIKE
+
+    Every query is a full table scan, so this is only meant as a fallback and
+    as the baseline the full-text backends are benchmarked against. Snippets
+    come from the stored summary so bodies are matched but never read back.
+    """
+    name = 'like'
+
+    def search(self, query, page=1, per_page=10):
+        pattern = f'%{query}%'
+        matches = db.session.query(
+            Post.id, Post.title, Post.slug, Post.published_at, Post._summary
+        ).filter(
+            Post.is_published == True,
+            Post.published_at.isnot(None),
+            (Post.title.ilike(pattern) | Post.content.ilike(pattern))
+        )
+        total = matches.count()
+        rows = matches.order_by(Post.published_at.desc())\
+            .limit(per_page)\
+            .offset((page - 1) * per_page)
+        terms = self.terms(query)
+        items = [
+            SearchHit(post_id, title, slug, published_at, make_snippet(html_to_text(summary), terms))
+            for post_id, title, slug, published_at, summary in rows
+        ]
+        return SearchPage(items, page, per_page, total)
@@ -0,0 +1,153 @@
+"""Search backend serving queries from an in-process inverted index"""
+import os
+import re
+import threading
+from app import db
+from app.models.post import Post
+from app.search.base import SearchBackend, SearchPage, hits_in_order, make_snippet, stamp
+from app.search.inverted import InvertedIndex, SnapshotError
+from app.utils.runtime import file_lock, runtime_path
+from app.utils.text import html_to_text, tokenize
+
+_PHRASE_RE = re.compile(r'"([^"]*)"')
+
+RECONCILE_BATCH_SIZE = 200
+
+def parse_query(query):
+    """Split a query into free terms and quoted phrases"""
+    phrases = [words for words in map(tokenize, _PHRASE_RE.findall(query)) if words]
+    terms = tokenize(_PHRASE_RE.sub(' ', query))
+    return terms, phrases
+
+class MemoryBackend(SearchBackend):
+    """BM25-ranked search over an :class:`InvertedIndex`
+
+    The index is shared between workers through a snapshot file (see
+    ``SEARCH_INDEX_PATH``). The worker that commits a post change applies it
+    and rewrites the snapshot under a file lock; other workers notice the new
+    file on their next query and reopen it. The first time a worker opens the
+    snapshot it is reconciled against the post ids and ``updated_at`` stamps
+    in the database, which is cheap because post bodies are only read for
+    posts that actually changed.
+    """
+    name = 'memory'
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.path = app.config.get('SEARCH_INDEX_PATH') or runtime_path(app, 'search.idx')
+        self._lock = threading.RLock()
+        self._index = None
+        self._signature = None
+        self._reconciled = False
+
+    def search(self, query, page=1, per_page=10):
+        terms, phrases = parse_query(query)
+        if not terms and not phrases:
+            return SearchPage([], page, per_page, 0)
+
+        start = (page - 1) * per_page
+        words = terms + [word for phrase in phrases for word in phrase]
+        with self._lock:
+            index = self._current()
+            ranked = index.search(terms, phrases)
+            ids = [post_id for post_id, _ in ranked[start:start + per_page]]
+            snippets = {post_id: make_snippet(index.text(post_id), words) for post_id in ids}
+
+        return SearchPage(hits_in_order(ids, snippets), page, per_page, len(ranked))
+
+    def apply(self, changes):
+        with self._lock, file_lock(self._lock_path):
+            if self._index is None or self._snapshot_changed():
+                self._index = self._read_snapshot()
+            if self._index is None:
+                # Nothing built yet; the first query builds from the database
+                return
+            for state in changes:
+                if state.is_published and not state.deleted:
+                    self._index.add(state.id, state.title, html_to_text(state.content), stamp(state.updated_at))
+                else:
+                    self._index.remove(state.id)
+            self._write_snapshot(self._index)
+
+    def rebuild(self):
+        with self._lock, file_lock(self._lock_path):
+            index = InvertedIndex()
+            posts = self._published_posts().execution_options(yield_per=RECONCILE_BATCH_SIZE)
+            for post_id, title, content, updated_at in posts:
+                index.add(post_id, title, html_to_text(content), stamp(updated_at))
+            self._write_snapshot(index)
+            self._index = index
+            self._reconciled = True
+
+    @property
+    def _lock_path(self):
+        return f'{self.path}.lock'
+
+    def _current(self):
+        """The up-to-date index, loading or building it on first use"""
+        if self._index is not None and self._reconciled and not self._snapshot_changed():
+            return self._index
+
+        with file_lock(self._lock_path):
+            if self._index is None or self._snapshot_changed():
+                self._index = self._read_snapshot()
+
+            if self._index is None:
+                self._index = InvertedIndex()
+                self._reconciled = False
+
+            if not self._reconciled:
+                if self._reconcile(self._index):
+                    self._write_snapshot(self._index)
+                self._reconciled = True
+        return self._index
+
+    def _reconcile(self, index):
+        """Bring an index in line with the database, returning True if it changed"""
+        wanted = {
+            post_id: stamp(updated_at)
+            for post_id, updated_at in db.session.query(Post.id, Post.updated_at).filter(
+                Post.is_published == True,
+                Post.published_at.isnot(None)
+            )
+        }
+        gone = [post_id for post_id in index.docs if post_id not in wanted]
+        stale = [
+            post_id for post_id, updated in wanted.items()
+            if post_id not in index.docs or index.docs[post_id].stamp != updated
+        ]
+
+        for post_id in gone:
+            index.remove(post_id)
+        for start in range(0, len(stale), RECONCILE_BATCH_SIZE):
+            batch = stale[start:start + RECONCILE_BATCH_SIZE]
+            for post_id, title, content, updated_at in self._published_posts().filter(Post.id.in_(batch)):
+                index.add(post_id, title, html_to_text(content), stamp(updated_at))
+        return bool(gone or stale)
+
+    def _published_posts(self):
+        return db.session.query(Post.id, Post.title, Post.content, Post.updated_at).filter(
+            Post.is_published == True,
+            Post.published_at.isnot(None)
+        )
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _snapshot_changed(self):
+        return self._stat() != self._signature
+
+    def _read_snapshot(self):
+        self._signature = self._stat()
+        try:
+            return InvertedIndex.load(self.path)
+        except (FileNotFoundError, SnapshotError):
+            return None
+
+    def _write_snapshot(self, index):
+        index.save(self.path)
+        self._signature = self._stat()
@@ -0,0 +1,97 @@
+"""Title typeahead served from an in-process prefix index"""
+import threading
+from bisect import bisect_left, insort
+from app import db
+from app.models.post import Post
+from app.search.base import stamp
+from app.utils.text import tokenize
+
+# How many index keys to look at before ranking; bounds the cost of a
+# very short prefix such as a single letter
+MAX_SCAN = 200
+
+def normalize(text):
+    """Lowercase a title and reduce it to single-spaced words"""
+    return ' '.join(tokenize(text))
+
+class TitleSuggester:
+    """Sorted array of title keys searched with bisect
+
+    Every published title is stored once per word, as the suffix of the
+    normalized title starting at that word, so "hex" matches both
+    "Hex Editors" and "Fun With Hex". Matches at the start of the title
+    rank first, then newer posts.
+    """
+
+    def __init__(self):
+        self._keys = []     # sorted (key, word index, post id)
+        self._posts = {}    # post id -> (title, slug, recency, keys)
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.generation = None
+
+    def __len__(self):
+        return len(self._posts)
+
+    def load(self, generation=None):
+        """Build the index from published post titles as of ``generation``"""
+        rows = db.session.query(Post.id, Post.title, Post.slug, Post.published_at).filter(
+            Post.is_published == True,
+            Post.published_at.isnot(None)
+        )
+        keys, posts = [], {}
+        for post_id, title, slug, published_at in rows:
+            entry_keys = self._keys_for(post_id, title)
+            posts[post_id] = (title, slug, stamp(published_at), entry_keys)
+            keys.extend(entry_keys)
+        keys.sort()
+        with self._lock:
+            self._keys, self._posts = keys, posts
+            self.generation = generation
+            self.loaded = True
+
+    def add(self, post_id, title, slug, published_at):
+        """Add or refresh a published post"""
+        with self._lock:
+            self._remove(post_id)
+            entry_keys = self._keys_for(post_id, title)
+            self._posts[post_id] = (title, slug, stamp(published_at), entry_keys)
+            for key in entry_keys:
+                insort(self._keys, key)
+
+    def remove(self, post_id):
+        """Drop a post from the index"""
+        with self._lock:
+            self._remove(post_id)
+
+    def suggest(self, prefix, limit=8):
+        """Return up to ``limit`` ``(title, slug)`` pairs matching ``prefix``"""
+        prefix = normalize(prefix)
+        if not prefix or limit < 1:
+            return []
+
+        with self._lock:
+            matches = {}
+            i = bisect_left(self._keys, (prefix,))
+            end = min(i + MAX_SCAN, len(self._keys))
+            while i < end and self._keys[i][0].startswith(prefix):
+                _, word, post_id = self._keys[i]
+                if word < matches.get(post_id, word + 1):
+                    matches[post_id] = word
+                i += 1
+            ranked = sorted(matches, key=lambda post_id: (matches[post_id], -self._posts[post_id][2]))
+            return [self._posts[post_id][:2] for post_id in ranked[:limit]]
+
+    def _remove(self, post_id):
+        entry = self._posts.pop(post_id, None)
+        if entry is None:
+            return
+        for key in entry[3]:
+            i = bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    @staticmethod
+    def _keys_for(post_id, title):
+        words = tokenize(title)
+        return [(' '.join(words[i:]), i, post_id) for i in range(len(words))]
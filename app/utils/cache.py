@@ -0,0 +1,100 @@
+"""In-process caches and cross-worker generation counters"""
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from app.utils.runtime import file_lock, runtime_path
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class Generations:
+    """Named counters shared by every worker through a small mmap'd file
+
+    A counter is bumped whenever the data it stands for changes. Caches
+    store the counter value next to each entry and treat the entry as stale
+    once the counter has moved on, which costs one memory read per lookup.
+    New names must be appended to NAMES so existing files keep their layout.
+    """
+    NAMES = ('content', 'users', 'settings')
+    SLOT = struct.Struct('<Q')
+    SIZE = 64 * SLOT.size
+
+    def __init__(self, path):
+        self.path = path
+        with file_lock(f'{path}.lock'):
+            with open(path, 'a+b') as handle:
+                if os.fstat(handle.fileno()).st_size < self.SIZE:
+                    handle.truncate(self.SIZE)
+                self._map = mmap.mmap(handle.fileno(), self.SIZE)
+
+    def current(self, name):
+        return self.SLOT.unpack_from(self._map, self._offset(name))[0]
+
+    def bump(self, name):
+        """Advance a counter, returning its new value"""
+        offset = self._offset(name)
+        with file_lock(f'{self.path}.lock'):
+            value = self.SLOT.unpack_from(self._map, offset)[0] + 1
+            self.SLOT.pack_into(self._map, offset, value)
+        return value
+
+    def _offset(self, name):
+        return self.NAMES.index(name) * self.SLOT.size
+
+def init_cache(app):
+    """Open the generation counters shared by the app's workers"""
+    path = app.config.get('GENERATIONS_PATH') or runtime_path(app, 'generations')
+    app.extensions['generations'] = Generations(path)
+
+def generation(name):
+    """Current value of a generation counter"""
+    return current_app.extensions['generations'].current(name)
+
+def bump_generation(name):
+    """Advance a generation counter, invalidating everything cached under it"""
+    if has_app_context() and 'generations' in current_app.extensions:
+        return current_app.extensions['generations'].bump(name)
+    return None
@@ -0,0 +1,156 @@
+"""Engine setup: connection pools, the SQLite production profile and read replicas
+
+SQLite's stock settings make readers wait behind a writer and fail a second
+writer straight away with "database is locked". The profile switches file
+databases to WAL, where readers keep going while a write commits, and gives
+every connection a busy timeout so writers queue for the lock instead.
+
+Views marked with :func:`read_replica` send their queries to one of the
+``SQLALCHEMY_REPLICAS`` engines; everything else, and every flush, goes to the
+primary. A signed-in user who has just written something reads from the
+primary for ``REPLICA_STICKY_SECONDS`` so they see their own change before the
+replicas catch up.
+
+Caches stamped with a generation are filled inside :func:`on_primary`. A
+replica that hasn't caught up with a commit would otherwise let a rebuild
+store the old data under the new generation, where it would pass for fresh
+until the next write.
+"""
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+# Session key holding the time until which a user reads from the primary
+STICKY_KEY = '_primary_until'
+
+def _is_sqlite(url):
+    return url.get_backend_name() == 'sqlite'
+
+def _is_memory(url):
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+def sqlite_pragmas(app):
+    """PRAGMA statements run on every new SQLite connection, in order"""
+    return [
+        # busy_timeout first so the journal mode switch can wait for the lock too
+        ('busy_timeout', app.config['SQLITE_BUSY_TIMEOUT']),
+        ('journal_mode', app.config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', app.config['SQLITE_SYNCHRONOUS']),
+        ('cache_size', app.config['SQLITE_CACHE_SIZE']),
+        ('mmap_size', app.config['SQLITE_MMAP_SIZE']),
+        ('temp_store', 'MEMORY'),
+    ]
+
+def engine_options(app, uri):
+    """Pool settings for the engine of ``uri``"""
+    url = make_url(uri)
+    if _is_sqlite(url) and _is_memory(url):
+        # In-memory databases live in a single connection; there is no pool to size
+        return {}
+    return {
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_POOL_MAX_OVERFLOW'],
+        'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+        'pool_recycle': app.config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': not _is_sqlite(url),
+    }
+
+def _apply_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+def _replica_engine(sess):
+    """The replica this request reads from, or None to use the primary"""
+    if sess._flushing or not has_request_context() or not g.get('db_replica') or g.get('db_primary'):
+        return None
+    if g.get('db_wrote') or session.get(STICKY_KEY, 0) > time.time():
+        return None
+    replicas = current_app.extensions.get('db_replicas')
+    if not replicas:
+        return None
+    if 'db_replica_engine' not in g:
+        # One replica per request, so its reads see a single snapshot
+        g.db_replica_engine = random.choice(replicas)
+    return g.db_replica_engine
+
+class RoutingSession(Session):
+    """Session that reads from a replica inside :func:`read_replica` views"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            engine = _replica_engine(self)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause, bind, **kwargs)
+
+def read_replica(view):
+    """Let a read-only view query a replica instead of the primary"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def on_primary():
+    """Send the block's queries to the primary, even inside a read_replica view"""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('db_primary', False)
+    g.db_primary = True
+    try:
+        yield
+    finally:
+        g.db_primary = previous
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _record_write(sess, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+def _stick_to_primary(response):
+    """Keep a signed-in user who just wrote on the primary for a while"""
+    if g.get('db_wrote') and '_user_id' in session:
+        session[STICKY_KEY] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+def init_database(app):
+    """Set up Flask-SQLAlchemy with the configured pools, SQLite profile and replicas"""
+    from app import db
+
+    options = engine_options(app, app.config['SQLALCHEMY_DATABASE_URI'])
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    db.init_app(app)
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    # Replicas hold the same tables as the primary, so they are plain engines
+    # rather than Flask-SQLAlchemy binds, which map their own set of models
+    replicas = [
+        create_engine(uri, **engine_options(app, uri))
+        for uri in app.config.get('SQLALCHEMY_REPLICAS') or []
+    ]
+    if replicas:
+        app.extensions['db_replicas'] = replicas
+        app.after_request(_stick_to_primary)
+
+    if not app.config['SQLITE_PROFILE']:
+        return
+    pragmas = sqlite_pragmas(app)
+    for engine in engines + replicas:
+        if _is_sqlite(engine.url):
+            _apply_pragmas(engine, pragmas)
@@ -1,10 +1,47 @@
-"""RSS feed generator for the blog"""
-from feedgen.feed import FeedGenerator
-from datetime import datetime, timezone
-from flask import url_for
-import html
+"""RSS, Atom and JSON Feed documents for the blog
+
+The writers produce a feed a chunk per entry, from rows fetched in batches,
+but the response is not streamed: the chunks are joined into one cached body
+because the ETag and Last-Modified are worked out from the whole document
+before any header is sent. Building it holds the output in memory, not a
+full ORM result set or an XML tree, and after that every poll is served from
+the cache until a post changes.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape, quoteattr
+from flask import current_app, url_for
+from sqlalchemy import func
+from app import db
+from app.models.post import Post
+from app.models.user import User
+from app.utils.cache import LRUCache, generation
+from app.utils.database import on_primary
+import hashlib
+import json
 import re
 
+FEED_TITLE = 'Hex Blag'
+FEED_DESCRIPTION = 'A retro-styled blog with a modern twist'
+
+# Rows fetched from the database per round trip while building a feed
+ROW_BATCH_SIZE = 100
+
+FeedEntry = namedtuple('FeedEntry', [
+    'url', 'title', 'summary', 'content', 'author', 'published', 'updated'
+])
+
+class CachedFeed:
+    """A serialized feed plus the validators sent with it"""
+    __slots__ = ('generation', 'body', 'etag', 'last_modified')
+
+    def __init__(self, generation, body, etag, last_modified):
+        self.generation = generation
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
 def clean_html(content):
     """Clean HTML content for RSS feed"""
     if not content:
@@ -15,42 +52,172 @@ def clean_html(content):
     text = re.sub(r'\s+', ' ', text).strip()
     return text
 
-def generate_feed(posts, site_url):
-    """Generate RSS feed from posts"""
-    fg = FeedGenerator()
-    fg.id(site_url)
-    fg.title('Hex Blag')
-    fg.description('A retro-styled blog with a modern twist')
-    fg.link(href=site_url)
-    fg.language('en')
-    
-    for post in posts:
-        try:
-            fe = fg.add_entry()
-            fe.id(url_for('main.post_detail', slug=post.slug, _external=True))
-            fe.title(post.title)
-            
-            # Clean and prepare content
-            content = clean_html(post.content)
-            summary = clean_html(post.summary) if post.summary else content[:200] + '...'
-            
-            fe.description(summary)
-            
-            # Add author info if available
-            if post.author:
-                fe.author(name=post.author.username)
-            
-            # Add timestamps, fallback to created_at if published_at is None
-            published = post.published_at or post.created_at
-            if published:
-                fe.published(published)
-            if post.updated_at:
-                fe.updated(post.updated_at)
-            
-            # Add the link to the post
-            fe.link(href=url_for('main.post_detail', slug=post.slug, _external=True))
-        except Exception as e:
-            # Skip problematic entries but continue generating feed
-            continue
-    
-    return fg
+def _utc(value):
+    """Treat naive datetimes from the database as UTC"""
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def _rfc3339(value):
+    return _utc(value).isoformat().replace('+00:00', 'Z')
+
+def iter_entries(limit):
+    """Yield the newest published posts as feed entries, a batch of rows at a time"""
+    rows = db.session.query(
+        Post.slug, Post.title, Post._summary, Post.content, Post.content_text,
+        Post.published_at, Post.created_at, Post.updated_at, User.username
+    ).outerjoin(Post.author)\
+        .filter(Post.is_published == True)\
+        .order_by(Post.published_at.desc())\
+        .limit(limit)\
+        .execution_options(yield_per=ROW_BATCH_SIZE)
+
+    for slug, title, summary, content, text, published_at, created_at, updated_at, author in rows:
+        if text is None:
+            # Not backfilled yet, see ``flask posts backfill-text``
+            text = clean_html(content)
+        yield FeedEntry(
+            url=url_for('main.post_detail', slug=slug, _external=True),
+            title=title,
+            summary=clean_html(summary) if summary else text[:200] + '...',
+            content=content,
+            author=author,
+            # Fall back to created_at if published_at is None
+            published=_utc(published_at or created_at),
+            updated=_utc(updated_at or published_at or created_at)
+        )
+
+def write_rss(entries, site_url, feed_url, updated):
+    """Serialize entries as RSS 2.0, one chunk per entry"""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" '
+        'xmlns:content="http://purl.org/rss/1.0/modules/content/" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>'
+        f'<title>{escape(FEED_TITLE)}</title>'
+        f'<link>{escape(site_url)}</link>'
+        f'<description>{escape(FEED_DESCRIPTION)}</description>'
+        f'<atom:link href={quoteattr(feed_url)} rel="self" type="application/rss+xml"/>'
+        '<language>en</language>'
+    )
+    if updated:
+        yield f'<lastBuildDate>{format_datetime(updated, usegmt=True)}</lastBuildDate>'
+    for entry in entries:
+        yield (
+            f'<item><title>{escape(entry.title)}</title>'
+            f'<link>{escape(entry.url)}</link>'
+            f'<guid isPermaLink="true">{escape(entry.url)}</guid>'
+            f'<description>{escape(entry.summary)}</description>'
+            f'<content:encoded>{escape(entry.content)}</content:encoded>'
+        )
+        if entry.author:
+            yield f'<dc:creator>{escape(entry.author)}</dc:creator>'
+        if entry.published:
+            yield f'<pubDate>{format_datetime(entry.published, usegmt=True)}</pubDate>'
+        yield '</item>'
+    yield '</channel></rss>\n'
+
+def write_atom(entries, site_url, feed_url, updated):
+    """Serialize entries as an Atom 1.0 feed, one chunk per entry"""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="en">'
+        f'<id>{escape(site_url)}/</id>'
+        f'<title>{escape(FEED_TITLE)}</title>'
+        f'<subtitle>{escape(FEED_DESCRIPTION)}</subtitle>'
+        f'<link href={quoteattr(site_url + "/")} rel="alternate" type="text/html"/>'
+        f'<link href={quoteattr(feed_url)} rel="self" type="application/atom+xml"/>'
+    )
+    if updated:
+        yield f'<updated>{_rfc3339(updated)}</updated>'
+    for entry in entries:
+        yield (
+            f'<entry><id>{escape(entry.url)}</id>'
+            f'<title>{escape(entry.title)}</title>'
+            f'<link href={quoteattr(entry.url)} rel="alternate"/>'
+            f'<updated>{_rfc3339(entry.updated)}</updated>'
+        )
+        if entry.published:
+            yield f'<published>{_rfc3339(entry.published)}</published>'
+        if entry.author:
+            yield f'<author><name>{escape(entry.author)}</name></author>'
+        yield (
+            f'<summary>{escape(entry.summary)}</summary>'
+            f'<content type="html">{escape(entry.content)}</content></entry>'
+        )
+    yield '</feed>\n'
+
+def write_json(entries, site_url, feed_url, updated):
+    """Serialize entries as JSON Feed 1.1, one chunk per entry"""
+    header = json.dumps({
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': FEED_TITLE,
+        'description': FEED_DESCRIPTION,
+        'home_page_url': site_url + '/',
+        'feed_url': feed_url,
+        'language': 'en'
+    }, ensure_ascii=False)
+    yield header[:-1] + ', "items": ['
+    separator = ''
+    for entry in entries:
+        item = {
+            'id': entry.url,
+            'url': entry.url,
+            'title': entry.title,
+            'summary': entry.summary,
+            'content_html': entry.content,
+            'date_modified': _rfc3339(entry.updated)
+        }
+        if entry.published:
+            item['date_published'] = _rfc3339(entry.published)
+        if entry.author:
+            item['authors'] = [{'name': entry.author}]
+        yield separator + json.dumps(item, ensure_ascii=False)
+        separator = ', '
+    yield ']}\n'
+
+FORMATS = {
+    'rss': (write_rss, 'application/rss+xml'),
+    'atom': (write_atom, 'application/atom+xml'),
+    'json': (write_json, 'application/feed+json')
+}
+
+def _feed_cache():
+    # One entry per format and site root, since entry links are absolute
+    return current_app.extensions.setdefault('feed_cache', LRUCache(maxsize=16))
+
+def _last_modified(previous, etag):
+    """Last-Modified for a rebuilt feed, which never moves backwards
+
+    Post timestamps can't be used: deleting or unpublishing the newest post
+    would send the date back, and clients polling with If-Modified-Since
+    alone would get a 304 for a feed that changed. An unchanged body keeps
+    its date; anything else is dated at the rebuild, which is after the
+    change that caused it.
+    """
+    if previous is not None and previous.etag == etag:
+        return previous.last_modified
+    # HTTP dates have whole seconds, so step past the previous one
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    if previous is not None and now <= previous.last_modified:
+        now = previous.last_modified + timedelta(seconds=1)
+    return now
+
+def cached_feed(format, site_url, feed_url):
+    """Return the serialized feed, rebuilding it only after content changed"""
+    cache = _feed_cache()
+    limit = current_app.config['FEED_ENTRY_COUNT']
+    key = (format, site_url, limit)
+    current = generation('content')
+    feed = cache.get(key)
+    if feed is not None and feed.generation == current:
+        return feed
+
+    with on_primary():
+        updated = _utc(db.session.query(func.max(Post.updated_at)).filter(Post.is_published == True).scalar())
+        writer, _ = FORMATS[format]
+        body = ''.join(writer(iter_entries(limit), site_url, feed_url, updated)).encode('utf-8')
+    etag = hashlib.sha1(body).hexdigest()
+    feed = CachedFeed(current, body, etag, _last_modified(feed, etag))
+    cache.set(key, feed)
+    return feed
@@ -0,0 +1,36 @@
+"""Cache for rendered template fragments
+
+Fragment keys carry the versions of everything the fragment shows, such as
+a post's ``updated_at``, so entries never need purging; stale versions just
+age out of the LRU.
+"""
+import re
+from flask import current_app, render_template
+from markupsafe import Markup
+from app.utils.cache import LRUCache
+
+_ACTIONS_RE = re.compile(r'<!--comment-actions (\d+) (\d+)-->')
+
+def _fragment_cache():
+    return current_app.extensions.setdefault('fragment_cache', LRUCache(
+        current_app.config.get('FRAGMENT_CACHE_SIZE', 512),
+        current_app.config.get('FRAGMENT_CACHE_TTL', 3600)
+    ))
+
+def cached_fragment(key, render):
+    """Return the HTML cached under ``key``, calling ``render`` on a miss"""
+    cache = _fragment_cache()
+    html = cache.get(key)
+    if html is None:
+        html = Markup(render())
+        cache.set(key, html)
+    return html
+
+def fill_comment_actions(html, user_id):
+    """Swap the per-comment placeholders for the viewer's delete forms"""
+    def actions(match):
+        comment_id, author_id = int(match.group(1)), int(match.group(2))
+        if author_id != user_id:
+            return ''
+        return render_template('main/_comment_actions.html', comment_id=comment_id)
+    return Markup(_ACTIONS_RE.sub(actions, html))
@@ -0,0 +1,77 @@
+"""Cross-request cache of signed-in users for ``load_user``
+
+Flask-Login loads the user behind the session cookie on every request. The
+cache keeps a detached copy of each recently seen user with their roles
+loaded, and merges it into the request's session without touching the
+database. Committing any change to a user or role bumps the shared ``users``
+generation, which drops every cached copy in every worker.
+"""
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, joinedload
+from app import db
+from app.models.user import Role, User
+from app.utils.cache import LRUCache, bump_generation, generation
+
+def init_identity_cache(app):
+    """Create the app's identity cache"""
+    app.extensions['identity_cache'] = LRUCache(
+        maxsize=app.config.setdefault('IDENTITY_CACHE_SIZE', 1024),
+        ttl=app.config.setdefault('IDENTITY_CACHE_TTL', 60)
+    )
+
+def _fetch_user(user_id):
+    """Load a detached user with roles, by ``fs_uniquifier`` or legacy integer id"""
+    if user_id.isdigit():
+        condition = User.id == int(user_id)
+    else:
+        condition = User.fs_uniquifier == user_id
+    # A private session, so the copy is never expired by a request's commit
+    with Session(db.engine) as session:
+        user = session.query(User).options(joinedload(User.roles)).filter(condition).first()
+        session.expunge_all()
+    return user
+
+def load_identity(user_id):
+    """Return the user for a session's user id, attached to the request's session"""
+    cache = current_app.extensions['identity_cache']
+    current = generation('users')
+    cached = cache.get(user_id)
+    if cached is not None and cached[0] == current:
+        _, user, role_names = cached
+    else:
+        user = _fetch_user(user_id)
+        if user is None:
+            return None
+        role_names = frozenset(role.name for role in user.roles)
+        cache.set(user_id, (current, user, role_names))
+    # Copy into this request's session as-is; the shared copy is never attached
+    user = db.session.merge(user, load=False)
+    user._role_names = role_names
+    return user
+
+def _changes_identity(session, obj):
+    """Whether a dirty object changes what a cached user looks like"""
+    if isinstance(obj, Role):
+        return True
+    if not isinstance(obj, User):
+        return False
+    # Posts and comments appended to a user's collections don't count
+    return session.is_modified(obj, include_collections=False) or \
+        inspect(obj).attrs.roles.history.has_changes()
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_user_changes(session, flush_context):
+    """Note whether this flush added, removed or changed a user or role"""
+    if any(isinstance(obj, (User, Role)) for obj in session.new | session.deleted) or \
+            any(_changes_identity(session, obj) for obj in session.dirty):
+        session.info['users_changed'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def _expire_identities(session):
+    if session.info.pop('users_changed', False):
+        bump_generation('users')
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_user_changes(session):
+    session.info.pop('users_changed', None)
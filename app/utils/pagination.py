@@ -0,0 +1,144 @@
+"""Keyset pagination with opaque cursor tokens"""
+import base64
+import json
+import math
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, tuple_
+from app.utils.cache import LRUCache, generation
+from app.utils.database import on_primary
+
+def encode_cursor(direction, value, ident, page):
+    """Pack a page boundary into a URL-safe token"""
+    raw = json.dumps([direction, value.isoformat(), ident, page], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b'=').decode()
+
+def decode_cursor(token):
+    """Unpack a cursor token, returning None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, value, ident, page = json.loads(raw)
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, datetime.fromisoformat(value), int(ident), max(int(page), 1)
+    except (ValueError, TypeError):
+        return None
+
+def page_number_arg(value):
+    """Canonical ``page`` query value for cache keys, None for the first page"""
+    try:
+        page = int(value)
+    except ValueError:
+        return None
+    return str(page) if page > 1 else None
+
+def cursor_arg(value):
+    """Canonical ``cursor`` query value for cache keys, None if malformed"""
+    state = decode_cursor(value)
+    return encode_cursor(*state) if state is not None else None
+
+class KeysetPage:
+    """One page of a keyset-paginated query
+
+    Mirrors the parts of Flask-SQLAlchemy's pagination the templates use,
+    with ``prev_cursor`` and ``next_cursor`` tokens in place of page numbers.
+    ``total`` and ``pages`` are None unless a count was asked for.
+    """
+
+    def __init__(self, items, page, per_page, total, prev_cursor, next_cursor):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return None
+        return max(math.ceil(self.total / self.per_page), 1)
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def cached_count(query, key):
+    """Count a query's rows, reusing the count until post content changes"""
+    cache = current_app.extensions.setdefault('count_cache', LRUCache(maxsize=64))
+    current = generation('content')
+    cached = cache.get(key)
+    if cached is not None and cached[0] == current:
+        return cached[1]
+    # Count rows rather than wrapping the selected columns in a subquery,
+    # so the database can answer from an index
+    with on_primary():
+        total = query.order_by(None).with_entities(func.count()).scalar()
+    cache.set(key, (current, total))
+    return total
+
+def paginate_keyset(query, column, id_column, per_page, cursor=None, page=1, count_key=None,
+                    item_factory=None):
+    """Return a newest-first page of ``query`` ordered by ``(column, id_column)``
+
+    With a cursor the page is found by comparing against the boundary row, so
+    deep pages cost the same as the first one. Without one, ``page`` is read
+    with an OFFSET to keep old ``?page=N`` links working; the cursors on that
+    page then take over. Pass ``count_key`` to also get a cached total, and
+    ``item_factory`` to turn each row into the object the page holds.
+    """
+    state = decode_cursor(cursor) if cursor else None
+    newest_first = (column.desc(), id_column.desc())
+
+    if state is None:
+        page = max(page or 1, 1)
+        rows = query.order_by(*newest_first)\
+            .offset((page - 1) * per_page)\
+            .limit(per_page + 1)\
+            .all()
+        has_prev, has_next = page > 1, len(rows) > per_page
+        rows = rows[:per_page]
+    else:
+        direction, value, ident, page = state
+        key, boundary = tuple_(column, id_column), tuple_(value, ident)
+        if direction == 'next':
+            rows = query.filter(key < boundary)\
+                .order_by(*newest_first)\
+                .limit(per_page + 1)\
+                .all()
+            has_prev, has_next = True, len(rows) > per_page
+            rows = rows[:per_page]
+        else:
+            rows = query.filter(key > boundary)\
+                .order_by(column.asc(), id_column.asc())\
+                .limit(per_page + 1)\
+                .all()
+            has_prev, has_next = len(rows) > per_page, True
+            rows = rows[:per_page][::-1]
+            if not has_prev:
+                page = 1
+
+    if item_factory is not None:
+        rows = [item_factory(row) for row in rows]
+
+    def boundary_of(row):
+        return getattr(row, column.key), getattr(row, id_column.key)
+
+    prev_cursor = next_cursor = None
+    if rows and has_prev:
+        prev_cursor = encode_cursor('prev', *boundary_of(rows[0]), page - 1)
+    if rows and has_next:
+        next_cursor = encode_cursor('next', *boundary_of(rows[-1]), page + 1)
+
+    total = cached_count(query, count_key) if count_key else None
+    return KeysetPage(rows, page, per_page, total, prev_cursor, next_cursor)
@@ -0,0 +1,86 @@
+"""Password hashing off the request thread
+
+Hashing and checking passwords is deliberately slow CPU work. Run inline, a
+burst of logins occupies every worker thread until it is done. With
+``PASSWORD_HASH_WORKERS`` set, the work goes to a process pool shared by the
+apps in this process instead. No more than ``PASSWORD_HASH_QUEUE``
+requests wait on the pool at once; past that, callers get
+:class:`HasherBusy` at once rather than queueing behind a flood of attempts.
+
+``PASSWORD_HASH_METHOD`` is any werkzeug method string, such as
+``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``. Hashes made with other
+settings still verify, and ``PasswordHasher.needs_rehash`` reports them so they can be
+upgraded at the next login.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Pools are per process and shared by every app in it, keyed by size
+_pools = {}
+_pools_lock = threading.Lock()
+
+class HasherBusy(Exception):
+    """Raised when too many password checks are already waiting"""
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+def _pool(workers):
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return _pools[workers]
+
+class PasswordHasher:
+    """Hashes and verifies passwords with one app's settings"""
+
+    def __init__(self, method, workers=0, max_pending=0):
+        self.method = method
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending or workers * 4 or 1)
+        self._prefix = None
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return _pool(self.workers).submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        if not pwhash or password is None:
+            return False
+        return self._run(_verify, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Whether a hash was made with different settings than the current ones"""
+        if self._prefix is None:
+            # werkzeug fills in defaults (``scrypt`` becomes ``scrypt:32768:8:1``),
+            # so read the full prefix off a real hash once
+            self._prefix = _hash('', self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._prefix
+
+def init_passwords(app):
+    """Set up the app's password hasher"""
+    app.extensions['passwords'] = PasswordHasher(
+        app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_QUEUE']
+    )
+
+def hasher():
+    """The current app's hasher, or inline defaults outside an app"""
+    if has_app_context() and 'passwords' in current_app.extensions:
+        return current_app.extensions['passwords']
+    return PasswordHasher('scrypt')
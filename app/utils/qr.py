@@ -0,0 +1,68 @@
+"""QR codes for two-factor setup, drawn as inline SVG
+
+The code for a user only changes with their TOTP secret (or the email shown
+in the authenticator app), so each worker keeps the markup for recent
+``(user, secret)`` pairs. The ``qrcode`` package is imported on the first
+miss rather than at startup, and only its matrix builder is used; there is no
+image rendering or base64 step.
+"""
+import pyotp
+from markupsafe import Markup
+from flask import current_app
+from app.utils.cache import LRUCache
+
+ISSUER = "Hex's Blog"
+
+# Light modules around the code, as the QR spec asks for
+BORDER = 4
+
+def provisioning_uri(secret, email):
+    """The otpauth:// URI authenticator apps read from the code"""
+    return pyotp.TOTP(secret).provisioning_uri(email, issuer_name=ISSUER)
+
+def qr_svg(data):
+    """Render ``data`` as an SVG QR code, one path of horizontal runs"""
+    from qrcode.main import QRCode
+    qr = QRCode(border=BORDER)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+
+    # Each row's dark modules become stroked runs, with relative moves
+    # between them, which keeps the path a fraction of one rect per module
+    segments = []
+    for y, row in enumerate(matrix):
+        x, end = 0, None
+        while x < len(row):
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < len(row) and row[x]:
+                x += 1
+            move = f'M{start} {y}.5' if end is None else f'm{start - end} 0'
+            segments.append(f'{move}h{x - start}')
+            end = x
+    size = len(matrix)
+    return Markup(
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'shape-rendering="crispEdges" role="img" aria-label="2FA QR Code">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path stroke="#000" d="{"".join(segments)}"/></svg>'
+    )
+
+def _qr_cache():
+    """The worker's cache of rendered setup codes"""
+    return current_app.extensions.setdefault('qr_cache', LRUCache(maxsize=256))
+
+def two_factor_qr(user):
+    """SVG QR code for a user's TOTP secret, or None without one"""
+    if not user.tf_totp_secret:
+        return None
+    cache = _qr_cache()
+    key = (user.id, user.tf_totp_secret, user.email)
+    svg = cache.get(key)
+    if svg is None:
+        svg = qr_svg(provisioning_uri(user.tf_totp_secret, user.email))
+        cache.set(key, svg)
+    return svg
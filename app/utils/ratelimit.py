@@ -0,0 +1,153 @@
+"""Per-client rate limits shared by every worker through an mmap'd table
+
+Limits are set per endpoint in ``RATELIMITS`` as ``count/period`` strings,
+like ``10/minute``, and apply to the endpoint's POST requests from one client
+address. They are checked in a ``before_request`` hook, so a rejected request
+never reaches a query or a password hash.
+
+Each client gets a slot in a fixed-size table of sliding-window counters: the
+hits in the current window plus a share of the previous window's hits that
+shrinks as the current one goes on. When a run of slots is full, the one that
+expires soonest is taken over, which at worst forgets an old client early.
+"""
+import hashlib
+import mmap
+import math
+import os
+import struct
+import time
+from flask import current_app, render_template, request
+from app.utils.runtime import file_lock, runtime_path
+
+DEFAULT_LIMITS = {
+    'auth.login': '10/minute',
+    'auth.two_factor': '10/minute',
+    'auth.recovery': '5/minute',
+    'auth.register': '5/hour',
+    'main.add_comment': '10/minute',
+}
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Slots checked for a key before one is taken over
+PROBES = 8
+
+def parse_limit(limit):
+    """Turn ``'10/minute'`` into ``(10, 60)``, or None for ``off``"""
+    if not limit or limit.strip().lower() == 'off':
+        return None
+    count, _, period = limit.strip().partition('/')
+    period = period.strip().lower().rstrip('s')
+    if period not in PERIODS or not count.strip().isdigit():
+        raise ValueError(f'Invalid rate limit {limit!r}, expected something like 10/minute')
+    return int(count), PERIODS[period]
+
+def parse_limits(value):
+    """Parse ``endpoint=limit`` pairs separated by commas"""
+    limits = {}
+    for pair in filter(None, (part.strip() for part in (value or '').split(','))):
+        endpoint, _, limit = pair.partition('=')
+        limits[endpoint.strip()] = limit.strip()
+    return limits
+
+class RateLimiter:
+    """Sliding-window hit counters in a fixed-size table shared through a file"""
+    # Key hash, window number, period in seconds, hits this window, hits last window
+    SLOT = struct.Struct('<QIIII')
+
+    def __init__(self, path, slots=4096):
+        self.path = path
+        self.slots = slots
+        size = slots * self.SLOT.size
+        with file_lock(f'{path}.lock'):
+            with open(path, 'a+b') as handle:
+                if os.fstat(handle.fileno()).st_size < size:
+                    handle.truncate(size)
+                self._map = mmap.mmap(handle.fileno(), size)
+
+    @staticmethod
+    def _hash(key):
+        # 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+    def _find(self, key_hash):
+        """Offset of the key's slot, or of the slot to take over for it"""
+        start = key_hash % self.slots
+        victim, victim_expires = None, None
+        # Look through every probe before taking one over: the key may sit
+        # past a slot that a colliding key has since left to expire
+        for probe in range(PROBES):
+            offset = (start + probe) % self.slots * self.SLOT.size
+            slot_hash, window, period, _, _ = self.SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                return offset
+            # A slot stops counting once its previous window has fully slid past
+            expires = (window + 2) * period if slot_hash else 0
+            if victim is None or expires < victim_expires:
+                victim, victim_expires = offset, expires
+        return victim
+
+    def hit(self, key, count, period, now=None):
+        """Count a hit for ``key``, returning 0 if allowed or the seconds to wait"""
+        now = time.time() if now is None else now
+        key_hash = self._hash(key)
+        window = int(now // period)
+        with file_lock(f'{self.path}.lock'):
+            offset = self._find(key_hash)
+            slot_hash, slot_window, slot_period, current, previous = self.SLOT.unpack_from(self._map, offset)
+            if slot_hash != key_hash or slot_period != period or slot_window < window - 1:
+                current = previous = 0
+            elif slot_window == window - 1:
+                current, previous = 0, current
+
+            # Share of the previous window still inside the sliding window
+            weight = 1 - (now / period - window)
+            if previous * weight + current + 1 > count:
+                return self._retry_after(count, period, now, window, current, previous)
+            self.SLOT.pack_into(self._map, offset, key_hash, window, period, current + 1, previous)
+        return 0
+
+    @staticmethod
+    def _retry_after(count, period, now, window, current, previous):
+        """Seconds until one more hit fits"""
+        room = count - 1 - current
+        if room < 0 or not previous:
+            # Only the next window resets this one's hits
+            wait = (window + 1) * period - now
+        else:
+            # Wait for enough of the previous window to slide out
+            wait = (1 - room / previous) * period - (now - window * period)
+        return max(1, math.ceil(wait))
+
+def _check_rate_limit():
+    if request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return None
+    limit = current_app.extensions['rate_limits'].get(request.endpoint)
+    if limit is None:
+        return None
+    count, period = limit
+    limiter = current_app.extensions['rate_limiter']
+    retry_after = limiter.hit(f'{request.endpoint}:{request.remote_addr}', count, period)
+    if not retry_after:
+        return None
+    current_app.logger.info(f'Rate limited {request.remote_addr} on {request.endpoint}')
+    response = current_app.make_response((
+        render_template('rate_limited.html', retry_after=retry_after), 429
+    ))
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def init_rate_limits(app):
+    """Open the shared limiter table and check limited endpoints before their views"""
+    if not app.config['RATELIMIT_ENABLED']:
+        return
+    limits = dict(DEFAULT_LIMITS)
+    limits.update(app.config.get('RATELIMITS') or {})
+    app.extensions['rate_limits'] = {
+        endpoint: parsed for endpoint, parsed in
+        ((endpoint, parse_limit(limit)) for endpoint, limit in limits.items())
+        if parsed is not None
+    }
+    path = app.config.get('RATELIMIT_PATH') or runtime_path(app, 'ratelimits')
+    app.extensions['rate_limiter'] = RateLimiter(path, slots=app.config['RATELIMIT_SLOTS'])
+    app.before_request(_check_rate_limit)
@@ -0,0 +1,35 @@
+"""Runtime files shared by every worker serving the same database"""
+import hashlib
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+def runtime_path(app, name):
+    """Path of a runtime file for the app's database
+
+    Files live in ``RUNTIME_DIR`` (``runtime`` in the instance folder by
+    default), which is created readable by the app's user only: other users
+    on the host must not be able to plant or swap out files the workers trust.
+    They are namespaced by database URI, so workers of one deployment share
+    them while separate databases never collide.
+    """
+    directory = app.config.get('RUNTIME_DIR') or os.path.join(app.instance_path, 'runtime')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    digest = hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:12]
+    return os.path.join(directory, f'hexblog-{digest}-{name}')
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock on ``path`` across processes"""
+    with open(path, 'a+b') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
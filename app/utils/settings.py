@@ -0,0 +1,52 @@
+"""Cached reads of the site_settings table
+
+Each worker keeps every setting in memory, stamped with the shared
+``settings`` generation, so reading one costs no query. Committing a change
+to any setting bumps the generation, and every worker reloads the table on
+its next read.
+"""
+from flask import current_app
+from sqlalchemy import event
+from app import db
+from app.models.settings import SiteSetting
+from app.utils.cache import bump_generation, generation
+from app.utils.database import on_primary
+
+# Values used until a setting has been saved
+DEFAULTS = {
+    'registration_enabled': False,
+}
+
+def _load_settings():
+    """Every saved setting, read through the worker's snapshot"""
+    # Read the generation first, so a change committed mid-load isn't cached as current
+    current = generation('settings')
+    cached = current_app.extensions.get('site_settings')
+    if cached is not None and cached[0] == current:
+        return cached[1]
+    with on_primary():
+        values = dict(db.session.query(SiteSetting.key, SiteSetting.value).all())
+    current_app.extensions['site_settings'] = (current, values)
+    return values
+
+def get_setting(key):
+    """Current value of a setting, or its default"""
+    return _load_settings().get(key, DEFAULTS.get(key))
+
+def set_setting(key, value):
+    """Save a setting in the current session; it applies once committed"""
+    db.session.merge(SiteSetting(key=key, value=value))
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_setting_changes(session, flush_context):
+    if any(isinstance(obj, SiteSetting) for obj in session.new | session.dirty | session.deleted):
+        session.info['settings_changed'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def _expire_settings(session):
+    if session.info.pop('settings_changed', False):
+        bump_generation('settings')
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_setting_changes(session):
+    session.info.pop('settings_changed', None)
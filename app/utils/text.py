@@ -0,0 +1,26 @@
+"""Plain-text helpers for post content"""
+import html
+import re
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_SPACE_RE = re.compile(r'\s+')
+_WORD_RE = re.compile(r'\w+')
+
+def html_to_text(content):
+    """Strip tags and entities from HTML, collapsing whitespace"""
+    if not content:
+        return ''
+    text = _TAG_RE.sub(' ', content)
+    text = html.unescape(text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    if not text:
+        return []
+    return _WORD_RE.findall(text.lower())
+
+def derive_text(content):
+    """Return the plain text of HTML content and its word count"""
+    text = html_to_text(content)
+    return text, len(_WORD_RE.findall(text))
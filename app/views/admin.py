@@ -1,11 +1,15 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from app.models.post import Post
+from app.models.listing import PostCard, post_cards
 from app.models.user import User
 from app import db
+from sqlalchemy import func, select
 from functools import wraps
 import os
 from app.utils.upload import save_image, delete_image
+from app.utils.pagination import paginate_keyset
+from app.utils.settings import get_setting, set_setting
 from werkzeug.utils import secure_filename
 import json
 import logging
@@ -38,10 +42,16 @@ def admin_required(f):
 @admin_required
 def index():
     """Admin dashboard"""
-    post_count = Post.query.count()
-    user_count = User.query.count()
-    draft_count = Post.query.filter_by(is_published=False).count()
-    recent_posts = Post.query.order_by(Post.created_at.desc()).limit(5).all()
+    # All three counts in one round trip
+    post_count, draft_count, user_count = db.session.query(
+        select(func.count(Post.id)).scalar_subquery(),
+        select(func.count(Post.id)).where(Post.is_published == False).scalar_subquery(),
+        select(func.count(User.id)).scalar_subquery()
+    ).one()
+    recent_posts = [
+        PostCard.from_row(row)
+        for row in post_cards().order_by(Post.created_at.desc(), Post.id.desc()).limit(5)
+    ]
     
     return render_template('admin/index.html',
                          post_count=post_count,
@@ -55,8 +65,9 @@ def index():
 def posts():
     """List all posts"""
     page = request.args.get('page', 1, type=int)
-    posts = Post.query.order_by(Post.created_at.desc())\
-        .paginate(page=page, per_page=10)
+    posts = paginate_keyset(post_cards(), Post.created_at, Post.id, per_page=10,
+                            cursor=request.args.get('cursor'), page=page,
+                            count_key='admin-posts', item_factory=PostCard.from_row)
     return render_template('admin/posts.html', posts=posts)
 
 @admin_bp.route('/post/new', methods=['GET', 'POST'])
@@ -227,8 +238,7 @@ def users():
         .order_by(User.created_at.desc())\
         .paginate(page=page, per_page=10)
     
-    # Get registration status from current user (who is an admin)
-    registration_enabled = current_user.registration_enabled
+    registration_enabled = get_setting('registration_enabled')
     
     # Get pending non-admin users
     pending_users = User.query.filter(
@@ -255,8 +265,7 @@ def toggle_registration():
     if form.validate_on_submit():
         enabled = request.form.get('registration_enabled') == 'on'
         
-        # Update the current admin user's registration_enabled setting
-        current_user.registration_enabled = enabled
+        set_setting('registration_enabled', enabled)
         db.session.commit()
         flash('Registration settings updated successfully! ^_^', 'success')
     else:
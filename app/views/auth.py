@@ -1,13 +1,13 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, session, current_app
 from flask_login import login_user, logout_user, login_required, current_user
-from app.models.user import User, Role
+from app.models.user import User
+from app.utils.passwords import HasherBusy
+from app.utils.settings import get_setting
 from app import db
+from sqlalchemy import or_
 from sqlalchemy.orm import joinedload
 import pyotp
 from datetime import datetime
-import qrcode
-import base64
-from io import BytesIO
 import secrets
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -28,7 +28,22 @@ def login():
         
         user = User.query.filter_by(email=email).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except HasherBusy:
+            flash('Too many people are logging in right now, please try again in a moment >_<', 'error')
+            return render_template('auth/login.html'), 503
+        
+        if valid:
+            if user.password_needs_rehash():
+                # Upgrade the stored hash to the current settings while we have the password
+                try:
+                    user.set_password(password)
+                    db.session.commit()
+                except HasherBusy:
+                    # The password checked out; the upgrade can wait for the next login
+                    pass
+            
             if not user.is_approved:
                 flash('Your account is pending approval >_<', 'error')
                 return render_template('auth/login.html')
@@ -84,9 +99,8 @@ def register():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
     
-    # Check if registration is enabled by checking any admin user's setting
-    admin = User.query.join(User.roles).filter(Role.name == 'admin').first()
-    if not admin or not admin.registration_enabled:
+    # A cached global flag, so checking it costs no query
+    if not get_setting('registration_enabled'):
         flash('Registration is currently disabled! >_<', 'error')
         return redirect(url_for('auth.login'))
         
@@ -106,36 +120,27 @@ def register():
             flash('Passwords must match! >w<', 'error')
             return render_template('auth/register.html')
         
-        if User.query.filter_by(email=email).first():
-            flash('Email already registered >_<', 'error')
-            return render_template('auth/register.html')
-            
-        if User.query.filter_by(username=username).first():
-            flash('Username already taken >_<', 'error')
+        # One lookup for both unique fields
+        taken = db.session.query(User.email, User.username)\
+            .filter(or_(User.email == email, User.username == username)).first()
+        if taken is not None:
+            if taken.email == email:
+                flash('Email already registered >_<', 'error')
+            else:
+                flash('Username already taken >_<', 'error')
             return render_template('auth/register.html')
         
-        user = User(email=email, username=username)
-        user.set_password(password)
-        
-        # Check if this is the first user (make them admin)
-        if User.query.count() == 0:
-            admin_role = Role.query.filter_by(name='admin').first()
-            if not admin_role:
-                admin_role = Role(name='admin', description='Administrator')
-                db.session.add(admin_role)
-            user.roles.append(admin_role)
-            user.is_approved = True
-            user.registration_enabled = True
-        else:
-            user.is_approved = False  # New users start unapproved
-        
+        # New users start unapproved
+        user = User(email=email, username=username, is_approved=False)
+        try:
+            user.set_password(password)
+        except HasherBusy:
+            flash('Too many people are signing up right now, please try again in a moment >_<', 'error')
+            return render_template('auth/register.html'), 503
         db.session.add(user)
         db.session.commit()
         
-        if user.has_role('admin'):
-            flash('Admin account created successfully! ✨', 'success')
-        else:
-            flash('Registration successful! Please wait for admin approval before logging in! ✨', 'success')
+        flash('Registration successful! Please wait for admin approval before logging in! ✨', 'success')
         return redirect(url_for('auth.login'))
         
     return render_template('auth/register.html')
@@ -166,22 +171,7 @@ def setup_2fa():
         current_user.tf_totp_secret = pyotp.random_base32()
         db.session.commit()
     
-    # Generate QR code
-    totp = pyotp.TOTP(current_user.tf_totp_secret)
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    provisioning_uri = totp.provisioning_uri(
-        current_user.email,
-        issuer_name="Hex's Blog"
-    )
-    qr.add_data(provisioning_uri)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffered = BytesIO()
-    img.save(buffered)
-    qr_code = base64.b64encode(buffered.getvalue()).decode()
-    
-    return render_template('auth/setup_2fa.html', qr_code=qr_code)
+    return render_template('auth/setup_2fa.html', qr_code=current_user.get_2fa_qr_code())
 
 @auth_bp.route('/disable-2fa', methods=['POST'])
 @login_required
@@ -1,36 +1,100 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, make_response, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, make_response, current_app, jsonify
 from flask_login import current_user, login_required
 from app.models.post import Post
+from app.models.listing import PostCard, post_neighbors, published_post_cards
 from app.models.comment import Comment
 from app.models.user import User
 from app.models.forms import CommentForm
-from app.utils.feed import generate_feed
+from app.utils.feed import FORMATS, cached_feed
+from app.search import search_posts, suggest_titles
+from app.utils.pagination import cursor_arg, page_number_arg, paginate_keyset
+from app.pagecache import ARCHIVE_TAG, LISTING_TAG, cached_page, post_tag, tag_page
+from app.utils.fragments import cached_fragment, fill_comment_actions
+from app.utils.database import read_replica
 from app import db
+from sqlalchemy.orm import defer, selectinload
 
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
+@read_replica
+@cached_page(LISTING_TAG, query_args={'page': page_number_arg, 'cursor': cursor_arg})
 def index():
     """Home page with list of blog posts"""
     page = request.args.get('page', 1, type=int)
-    posts = Post.query.filter(
-        Post.is_published == True,
-        Post.published_at.isnot(None)
-    ).order_by(Post.published_at.desc())\
-        .paginate(page=page, per_page=5)
+    posts = paginate_keyset(published_post_cards(), Post.published_at, Post.id, per_page=5,
+                            cursor=request.args.get('cursor'), page=page,
+                            count_key='index', item_factory=PostCard.from_row)
     return render_template('main/index.html', posts=posts)
 
 @main_bp.route('/post/<string:slug>')
+@read_replica
+@cached_page(ARCHIVE_TAG)
 def post_detail(slug):
     """Individual blog post page"""
-    # Only show published posts
-    post = Post.query.filter(
+    # Only show published posts; the body is only loaded when its
+    # rendered fragment isn't cached
+    post = Post.query.options(defer(Post.content), defer(Post.content_text)).filter(
         Post.slug == slug,
         Post.is_published == True,
         Post.published_at.isnot(None)
     ).first_or_404()
-    comment_form = CommentForm()
-    return render_template('main/post.html', post=post, comment_form=comment_form)
+    prev_post, next_post = post_neighbors(post)
+    tag_page(*(post_tag(neighbor.id) for neighbor in (post, prev_post, next_post) if neighbor))
+    
+    body_html = cached_fragment(
+        ('post-body', post.id, post.updated_at),
+        lambda: render_template('main/_post_body.html', post=post)
+    )
+    comments_html = cached_fragment(
+        ('post-comments', post.id, post.comments_version),
+        lambda: render_template('main/_comments.html', post_id=post.id, comments=comment_page(post.id))
+    )
+    
+    # Building the form issues a CSRF token, which would start a session
+    comment_form = CommentForm() if current_user.is_authenticated else None
+    comments_html = fill_comment_actions(comments_html, _viewer_id())
+    return render_template('main/post.html', post=post, comment_form=comment_form,
+                           body_html=body_html, comments_html=comments_html,
+                           prev_post=prev_post, next_post=next_post)
+
+def comment_page(post_id, cursor=None):
+    """One page of a post's comments, newest first, with their authors"""
+    comments = Comment.query.options(selectinload(Comment.author)).filter_by(post_id=post_id)
+    return paginate_keyset(comments, Comment.created_at, Comment.id,
+                           per_page=current_app.config['COMMENTS_PER_PAGE'], cursor=cursor)
+
+def _viewer_id():
+    return current_user.id if current_user.is_authenticated else None
+
+@main_bp.route('/post/<int:post_id>/comments')
+@read_replica
+def post_comments(post_id):
+    """Load the next page of comments as JSON"""
+    db.session.query(Post.id).filter(
+        Post.id == post_id,
+        Post.is_published == True,
+        Post.published_at.isnot(None)
+    ).first_or_404()
+    
+    comments = comment_page(post_id, request.args.get('cursor'))
+    html = render_template('main/_comment_items.html', comments=comments)
+    next_url = None
+    if comments.has_next:
+        next_url = url_for('main.post_comments', post_id=post_id, cursor=comments.next_cursor)
+    return jsonify({
+        'comments': [
+            {
+                'id': comment.id,
+                'author': comment.author.display_name or comment.author.username,
+                'content': comment.content,
+                'created_at': comment.created_at.isoformat()
+            }
+            for comment in comments
+        ],
+        'html': fill_comment_actions(html, _viewer_id()),
+        'next_url': next_url
+    })
 
 @main_bp.route('/post/<int:post_id>/comment', methods=['POST'])
 @login_required
@@ -58,16 +122,18 @@ def add_comment(post_id):
 def delete_comment(comment_id):
     """Delete a comment"""
     comment = Comment.query.get_or_404(comment_id)
+    # Read before the delete; the comment can't load its post afterwards
+    slug = comment.post.slug
     
     if comment.author != current_user:
         flash('You can only delete your own comments! >_<', 'error')
-        return redirect(url_for('main.post_detail', slug=comment.post.slug))
+        return redirect(url_for('main.post_detail', slug=slug))
     
     db.session.delete(comment)
     db.session.commit()
     flash('Comment deleted successfully! ✨', 'success')
     
-    return redirect(url_for('main.post_detail', slug=comment.post.slug))
+    return redirect(url_for('main.post_detail', slug=slug))
 
 @main_bp.route('/about')
 def about():
@@ -75,44 +141,70 @@ def about():
     return render_template('main/about.html')
 
 @main_bp.route('/search')
+@read_replica
 def search():
     """Search for blog posts"""
     query = request.args.get('q', '').strip()
     if not query:
         flash('Please enter a search term! uwu', 'info')
         return redirect(url_for('main.index'))
-        
-    posts = Post.query.filter(
-        Post.is_published == True,  # Only show published posts
-        Post.published_at.isnot(None),  # Only show posts with published_at date
-        (Post.title.ilike(f'%{query}%') |  # Search in title
-         Post.content.ilike(f'%{query}%'))  # Search in content
-    ).order_by(Post.published_at.desc()).all()
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    posts = search_posts(query, page=page, per_page=10)
     
     return render_template('main/search.html', posts=posts, query=query)
 
-@main_bp.route('/feed.xml')
-def rss_feed():
-    """Generate RSS feed of published posts"""
+@main_bp.route('/search/suggest')
+@read_replica
+def search_suggest():
+    """Autocomplete published post titles for the search box"""
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('n', 0, type=int), 20) or None
+    suggestions = suggest_titles(query, limit) if query else []
+    return jsonify({
+        'query': query,
+        'results': [
+            {'title': title, 'slug': slug, 'url': url_for('main.post_detail', slug=slug)}
+            for title, slug in suggestions
+        ]
+    })
+
+def _feed_response(format, endpoint):
+    """Serve a cached feed document with validators for conditional GETs"""
     try:
-        # Get published posts, ordered by publish date
-        posts = Post.query.filter_by(is_published=True)\
-            .order_by(Post.published_at.desc())\
-            .limit(20)\
-            .all()
-        
-        # Generate feed
+        # The serialized feed is cached until a post changes, so an
+        # unchanged poll is answered from memory with a 304
         site_url = request.url_root.rstrip('/')
-        fg = generate_feed(posts, site_url)
+        feed = cached_feed(format, site_url, url_for(endpoint, _external=True))
         
         # Create the response
-        response = make_response(fg.rss_str())
-        response.headers.set('Content-Type', 'application/rss+xml')
-        return response
+        response = make_response(feed.body)
+        response.headers.set('Content-Type', f'{FORMATS[format][1]}; charset=utf-8')
+        response.set_etag(feed.etag)
+        response.last_modified = feed.last_modified
+        return response.make_conditional(request)
     except Exception as e:
-        current_app.logger.error(f"Error generating RSS feed: {str(e)}")
+        current_app.logger.error(f"Error generating {format} feed: {str(e)}")
         abort(500)
 
+@main_bp.route('/feed.xml')
+@read_replica
+def rss_feed():
+    """Generate RSS feed of published posts"""
+    return _feed_response('rss', 'main.rss_feed')
+
+@main_bp.route('/feed.atom')
+@read_replica
+def atom_feed():
+    """Generate Atom feed of published posts"""
+    return _feed_response('atom', 'main.atom_feed')
+
+@main_bp.route('/feed.json')
+@read_replica
+def json_feed():
+    """Generate JSON Feed of published posts"""
+    return _feed_response('json', 'main.json_feed')
+
 @main_bp.route('/feed')
 def feed_redirect():
     """Redirect /feed to /feed.xml"""
@@ -0,0 +1,29 @@
+"""Add plain-text and word-count columns to posts
+
+Revision ID: 3f1a9d27b8e4
+Revises: c59162c489ad
+Create Date: 2026-10-18 14:05:19.220931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a9d27b8e4'
+down_revision = 'c59162c489ad'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows are filled in by `flask posts backfill-text`
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_text', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('word_count', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('word_count')
+        batch_op.drop_column('content_text')
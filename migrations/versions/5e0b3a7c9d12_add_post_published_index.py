@@ -0,0 +1,23 @@
+"""Add a (is_published, published_at, id) index to posts
+
+Revision ID: 5e0b3a7c9d12
+Revises: d41c7a9e2b65
+Create Date: 2026-10-18 18:03:36.274190
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0b3a7c9d12'
+down_revision = 'd41c7a9e2b65'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_post_published_at_id', 'post', ['is_published', 'published_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_post_published_at_id', table_name='post')
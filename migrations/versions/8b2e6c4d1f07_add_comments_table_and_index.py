@@ -0,0 +1,39 @@
+"""Add comments table and (post_id, created_at) index
+
+Revision ID: 8b2e6c4d1f07
+Revises: 3f1a9d27b8e4
+Create Date: 2026-10-18 16:42:07.513824
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e6c4d1f07'
+down_revision = '3f1a9d27b8e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The comments table was only ever created by db.create_all(), so
+    # databases built from migrations alone don't have it yet
+    if not sa.inspect(op.get_bind()).has_table('comments'):
+        op.create_table('comments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['author_id'], ['user.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+    op.create_index('ix_comments_post_id_created_at', 'comments', ['post_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    # The table itself is left alone; it may predate this migration
+    op.drop_index('ix_comments_post_id_created_at', table_name='comments')
@@ -0,0 +1,67 @@
+"""Add full-text search index for posts
+
+Revision ID: c59162c489ad
+Revises: 67d5433e92e3
+Create Date: 2026-10-18 10:12:41.402215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import html
+import re
+
+
+# revision identifiers, used by Alembic.
+revision = 'c59162c489ad'
+down_revision = '67d5433e92e3'
+branch_labels = None
+depends_on = None
+
+POSTGRES_DOCUMENT = (
+    "(setweight(to_tsvector('english', coalesce(post.title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(post.content, '')), 'B'))"
+)
+
+BATCH_SIZE = 500
+
+
+def _html_to_text(content):
+    text = re.sub(r'<[^>]+>', ' ', content or '')
+    return re.sub(r'\s+', ' ', html.unescape(text)).strip()
+
+
+def _backfill_sqlite(bind):
+    insert = sa.text('INSERT INTO post_fts (rowid, title, body) VALUES (:id, :title, :body)')
+    rows = bind.execute(sa.text(
+        'SELECT id, title, content FROM post '
+        'WHERE is_published AND published_at IS NOT NULL'
+    ))
+    while True:
+        batch = rows.fetchmany(BATCH_SIZE)
+        if not batch:
+            break
+        bind.execute(insert, [
+            {'id': post_id, 'title': title, 'body': _html_to_text(content)}
+            for post_id, title, content in batch
+        ])
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts "
+            "USING fts5(title, body, tokenize='porter unicode61')"
+        )
+        _backfill_sqlite(bind)
+    elif bind.dialect.name == 'postgresql':
+        # The expression index is built from existing rows as it is created
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_post_search ON post USING gin ({POSTGRES_DOCUMENT})")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS post_fts')
+    elif bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_post_search')
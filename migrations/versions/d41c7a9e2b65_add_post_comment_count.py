@@ -0,0 +1,32 @@
+"""Add a denormalized comment count to posts
+
+Revision ID: d41c7a9e2b65
+Revises: 8b2e6c4d1f07
+Create Date: 2026-10-18 17:20:51.083412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c7a9e2b65'
+down_revision = '8b2e6c4d1f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Same as `flask posts reconcile-comments`
+    op.execute(
+        'UPDATE post SET comment_count = '
+        '(SELECT COUNT(*) FROM comments WHERE comments.post_id = post.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
@@ -0,0 +1,54 @@
+"""Move the registration switch from admin users to a site_settings table
+
+Revision ID: e6c1f48a2d93
+Revises: a7f2c19e4b38
+Create Date: 2026-10-18 21:04:37.215846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# Just the columns used below, as they are at this revision
+user = sa.table('user', sa.column('id', sa.Integer), sa.column('registration_enabled', sa.Boolean))
+role = sa.table('role', sa.column('id', sa.Integer), sa.column('name', sa.String))
+roles_users = sa.table('roles_users', sa.column('user_id', sa.Integer), sa.column('role_id', sa.Integer))
+admin_ids = sa.select(roles_users.c.user_id)\
+    .join(role, role.c.id == roles_users.c.role_id).where(role.c.name == 'admin')
+
+# revision identifiers, used by Alembic.
+revision = 'e6c1f48a2d93'
+down_revision = 'a7f2c19e4b38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    site_settings = op.create_table('site_settings',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('value', sa.JSON(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+    # Registration was open if any admin had switched it on
+    enabled = op.get_bind().execute(
+        sa.select(user.c.id).where(user.c.id.in_(admin_ids), user.c.registration_enabled.is_(True)).limit(1)
+    ).first() is not None
+    op.bulk_insert(site_settings, [{'key': 'registration_enabled', 'value': enabled}])
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('registration_enabled')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('registration_enabled', sa.Boolean(), nullable=True, server_default='0'))
+
+    site_settings = sa.table('site_settings', sa.column('key', sa.String), sa.column('value', sa.JSON))
+    value = op.get_bind().execute(
+        sa.select(site_settings.c.value).where(site_settings.c.key == 'registration_enabled')
+    ).scalar()
+    if value:
+        op.execute(user.update().where(user.c.id.in_(admin_ids)).values(registration_enabled=True))
+    op.drop_table('site_settings')
@@ -0,0 +1,26 @@
+"""Add a comments version to posts for the cached comment list
+
+Revision ID: f2a9c3d7e481
+Revises: e6c1f48a2d93
+Create Date: 2026-10-19 10:42:13.570218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a9c3d7e481'
+down_revision = 'e6c1f48a2d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comments_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('comments_version')
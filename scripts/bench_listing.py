@@ -0,0 +1,87 @@
+"""Benchmark post listings loaded as ORM objects against PostCard projections
+
+Usage: python scripts/bench_listing.py [--posts 2000] [--body-kb 50] [--per-page 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import create_app, db
+from app.models.listing import PostCard, published_post_cards
+from app.models.post import Post
+from app.models.user import User
+
+def populate(count, body_kb):
+    """Bulk insert ``count`` published posts with large bodies"""
+    author = User(email='bench@example.com', username='bench', password='x')
+    db.session.add(author)
+    db.session.commit()
+
+    body = '<p>' + 'retro pixel synth modem ' * (body_kb * 1024 // 24) + '</p>'
+    start = datetime.now(timezone.utc) - timedelta(days=count)
+    db.session.execute(Post.__table__.insert(), [{
+        'title': f'Bench post {i}',
+        'slug': f'bench-post-{i}',
+        'content': body,
+        'content_text': body[3:-4],
+        'word_count': body_kb * 1024 // 6,
+        'is_published': True,
+        'published_at': start + timedelta(days=i),
+        'author_id': author.id,
+    } for i in range(count)])
+    db.session.commit()
+
+def load_orm(per_page):
+    posts = Post.query.filter(Post.is_published == True)\
+        .order_by(Post.published_at.desc()).limit(per_page).all()
+    return [(post.title, post.slug, post.author.username) for post in posts]
+
+def load_cards(per_page):
+    rows = published_post_cards().order_by(Post.published_at.desc()).limit(per_page)
+    return [(card.title, card.slug, card.preview) for card in map(PostCard.from_row, rows)]
+
+def measure(loader, per_page, rounds=20):
+    """Return mean ms and peak KiB of one listing"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        loader(per_page)
+        db.session.remove()
+    elapsed = (time.perf_counter() - start) * 1000 / rounds
+
+    tracemalloc.start()
+    loader(per_page)
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    db.session.remove()
+    return elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--body-kb', type=int, default=50)
+    parser.add_argument('--per-page', type=int, default=50)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'})
+    try:
+        with app.app_context():
+            db.create_all()
+            populate(args.posts, args.body_kb)
+            for name, loader in (('orm', load_orm), ('cards', load_cards)):
+                elapsed, peak = measure(loader, args.per_page)
+                print(f'{name:<6} {elapsed:8.2f} ms   peak {peak:10.0f} KiB')
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark a flood of logins, hashing inline and in a process pool, and the pages served meanwhile
+
+Usage: python scripts/bench_login.py [--threads 16] [--seconds 5] [--workers 4] [--queue 0] [--method scrypt:32768:8:1]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import create_app, db
+from app.models.user import User
+
+def hammer(app, deadline, results):
+    """Log in and out until ``deadline``, recording each login's latency"""
+    client = app.test_client()
+    latencies, refused = [], 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        response = client.post('/auth/login', data={'email': 'bench@example.com', 'password': 'hunter22'})
+        if response.status_code == 503:
+            refused += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+        client.get('/auth/logout')
+    with results['lock']:
+        results['latencies'] += latencies
+        results['refused'] += refused
+
+def browse(app, deadline, results):
+    """Load the front page until ``deadline``, recording each view's latency"""
+    client = app.test_client()
+    latencies = []
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        client.get('/')
+        latencies.append(time.perf_counter() - start)
+    with results['lock']:
+        results['pages'] += latencies
+
+def p95(latencies):
+    latencies = sorted(latencies)
+    return latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+
+def run(workers, args):
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'WTF_CSRF_ENABLED': False,
+        'PASSWORD_HASH_METHOD': args.method,
+        'PASSWORD_HASH_WORKERS': workers,
+        'PASSWORD_HASH_QUEUE': args.queue
+    })
+    try:
+        with app.app_context():
+            db.create_all()
+            user = User(email='bench@example.com', username='bench', is_approved=True)
+            user.set_password('hunter22')
+            db.session.add(user)
+            db.session.commit()
+
+        results = {'lock': threading.Lock(), 'latencies': [], 'pages': [], 'refused': 0}
+        deadline = time.monotonic() + args.seconds
+        threads = [threading.Thread(target=hammer, args=(app, deadline, results)) for _ in range(args.threads)]
+        threads.append(threading.Thread(target=browse, args=(app, deadline, results)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        name = f'pool({workers})' if workers else 'inline'
+        print(f'{name:<8} {len(results["latencies"]) / args.seconds:6.1f} logins/s '
+              f'(p95 {p95(results["latencies"]):6.0f} ms, {results["refused"]} refused)   '
+              f'front page p95 {p95(results["pages"]):6.0f} ms')
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--queue', type=int, default=0)
+    parser.add_argument('--method', default='scrypt:32768:8:1')
+    args = parser.parse_args()
+
+    for workers in (0, args.workers):
+        run(workers, args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark the search backends against the ILIKE scan
+
+Usage: python scripts/bench_search.py [--sizes 10000 100000] [--queries 50]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import create_app, db
+from app.models.post import Post
+from app.models.user import User
+from app.search import BACKENDS, get_backend
+
+WORDS = (
+    'retro pixel synth modem hacker webring marquee gif glitter neon cursor '
+    'terminal floppy keyboard dragon dungeon dice wizard rogue paladin '
+    'kernel socket packet router cable solder circuit arduino sensor '
+    'coffee tea cat fox moth star moon comet nebula galaxy'
+).split()
+
+def make_body(rng, words=400):
+    """Build a fake HTML post body"""
+    paragraphs = []
+    for _ in range(words // 50):
+        paragraphs.append('<p>' + ' '.join(rng.choice(WORDS) for _ in range(50)) + '</p>')
+    return '\n'.join(paragraphs)
+
+def populate(count, rng):
+    """Bulk insert ``count`` published posts"""
+    author = User(email='bench@example.com', username='bench', password='x')
+    db.session.add(author)
+    db.session.commit()
+
+    start = datetime.now(timezone.utc) - timedelta(days=count)
+    batch = []
+    for i in range(count):
+        batch.append({
+            'title': ' '.join(rng.choice(WORDS) for _ in range(4)).title(),
+            'slug': f'bench-post-{i}',
+            'content': make_body(rng),
+            'summary': None,
+            'is_published': True,
+            'published_at': start + timedelta(days=i),
+            'author_id': author.id,
+        })
+        if len(batch) == 1000:
+            db.session.execute(Post.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Post.__table__.insert(), batch)
+    db.session.commit()
+
+def time_queries(backend, queries):
+    """Return the mean and worst latency of first-page searches in ms"""
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        backend.search(query, page=1, per_page=10)
+        timings.append((time.perf_counter() - start) * 1000)
+        db.session.rollback()
+    return sum(timings) / len(timings), max(timings)
+
+def run(size, query_count):
+    rng = random.Random(size)
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    memory_path = f'{db_path}.idx'
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SEARCH_BACKEND': 'sqlite-fts',
+        'SEARCH_INDEX_PATH': memory_path,
+    })
+    try:
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            populate(size, rng)
+            print(f'  inserted {size} posts in {time.perf_counter() - start:.1f}s')
+
+            start = time.perf_counter()
+            get_backend().rebuild()
+            print(f'  built FTS5 index in {time.perf_counter() - start:.1f}s')
+
+            memory = BACKENDS['memory'](app)
+            start = time.perf_counter()
+            memory.rebuild()
+            print(f'  built memory index in {time.perf_counter() - start:.1f}s')
+
+            start = time.perf_counter()
+            BACKENDS['memory'](app).search(WORDS[0])
+            print(f'  warm-started a worker from the snapshot in {time.perf_counter() - start:.2f}s')
+
+            queries = [rng.choice(WORDS) for _ in range(query_count)]
+            for backend in (BACKENDS['like'](app), get_backend(), memory):
+                mean, worst = time_queries(backend, queries)
+                print(f'  {backend.name:<12} mean {mean:8.2f} ms   worst {worst:8.2f} ms')
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+        for path in (memory_path, f'{memory_path}.lock'):
+            if os.path.exists(path):
+                os.unlink(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        print(f'{size} posts:')
+        run(size, args.queries)
+
+if __name__ == '__main__':
+    main()
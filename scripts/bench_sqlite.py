@@ -0,0 +1,122 @@
+"""Benchmark read throughput while comments are being written, with and without the SQLite profile
+
+Usage: python scripts/bench_sqlite.py [--posts 500] [--readers 8] [--writers 2] [--seconds 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy.exc import OperationalError
+from app import create_app, db
+from app.models.comment import Comment
+from app.models.listing import published_post_cards
+from app.models.post import Post
+from app.models.user import User
+
+def populate(count):
+    """Bulk insert ``count`` published posts"""
+    author = User(email='bench@example.com', username='bench', password='x')
+    db.session.add(author)
+    db.session.commit()
+
+    start = datetime.now(timezone.utc) - timedelta(days=count)
+    db.session.execute(Post.__table__.insert(), [{
+        'title': f'Bench post {i}',
+        'slug': f'bench-post-{i}',
+        'content': '<p>retro pixel synth modem</p>',
+        'content_text': 'retro pixel synth modem',
+        'word_count': 4,
+        'is_published': True,
+        'published_at': start + timedelta(days=i),
+        'author_id': author.id,
+    } for i in range(count)])
+    db.session.commit()
+    return author.id
+
+def read(post_ids):
+    """One page view: a listing plus a post's comments"""
+    published_post_cards().order_by(Post.published_at.desc()).limit(20).all()
+    Comment.query.filter_by(post_id=post_ids[int(time.perf_counter_ns()) % len(post_ids)])\
+        .order_by(Comment.created_at.desc()).limit(20).all()
+
+def write(post_ids, author_id):
+    """One comment post"""
+    post_id = post_ids[int(time.perf_counter_ns()) % len(post_ids)]
+    db.session.add(Comment(content='First!', post_id=post_id, author_id=author_id))
+    db.session.commit()
+
+def hammer(app, action, deadline, counts, key):
+    """Repeat ``action`` until ``deadline``, counting successes and lock errors"""
+    done = locked = 0
+    with app.app_context():
+        while time.monotonic() < deadline:
+            try:
+                action()
+                done += 1
+            except OperationalError:
+                locked += 1
+                db.session.rollback()
+            finally:
+                db.session.remove()
+    with counts['lock']:
+        counts[key] += done
+        counts[f'{key}_locked'] += locked
+
+def run(profile, args):
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SQLITE_PROFILE': profile,
+        'DB_POOL_SIZE': args.readers + args.writers
+    })
+    try:
+        with app.app_context():
+            db.create_all()
+            author_id = populate(args.posts)
+            post_ids = [post_id for post_id, in db.session.query(Post.id)]
+
+        counts = {'lock': threading.Lock(), 'reads': 0, 'reads_locked': 0,
+                  'writes': 0, 'writes_locked': 0}
+        deadline = time.monotonic() + args.seconds
+        threads = [
+            threading.Thread(target=hammer, args=(app, lambda: read(post_ids), deadline, counts, 'reads'))
+            for _ in range(args.readers)
+        ] + [
+            threading.Thread(target=hammer, args=(app, lambda: write(post_ids, author_id), deadline, counts, 'writes'))
+            for _ in range(args.writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        name = 'profile' if profile else 'stock'
+        print(f'{name:<8} reads {counts["reads"] / args.seconds:8.0f}/s ({counts["reads_locked"]} locked)   '
+              f'writes {counts["writes"] / args.seconds:6.0f}/s ({counts["writes_locked"]} locked)')
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=500)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    for profile in (False, True):
+        run(profile, args)
+
+if __name__ == '__main__':
+    main()
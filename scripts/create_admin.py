@@ -8,6 +8,7 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from app import create_app, db
 from app.models.user import User, Role
+from app.utils.settings import set_setting
 from dotenv import load_dotenv
 
 def create_admin_user():
@@ -41,13 +42,13 @@ def create_admin_user():
             username='admin',
             display_name='Admin',
             active=True,
-            is_approved=True,
-            registration_enabled=True  # Enable registration by default
+            is_approved=True
         )
         admin_user.set_password(admin_password)
         admin_user.roles.append(admin_role)
         
         db.session.add(admin_user)
+        set_setting('registration_enabled', True)  # Enable registration by default
         db.session.commit()
         
         print(f"Created admin user {admin_email} successfully! ✨")
@@ -12,6 +12,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from app import create_app, db
 from app.models.user import User, Role
 from app.models.post import Post
+from app.utils.settings import set_setting
 
 @pytest.fixture
 def app():
@@ -41,8 +42,7 @@ def app():
             username='admin',
             display_name='Test Admin',
             active=True,
-            is_approved=True,
-            registration_enabled=True
+            is_approved=True
         )
         admin.set_password('password123')
         admin.roles.append(admin_role)
@@ -58,12 +58,16 @@ def app():
         )
         post.publish()  # This will set published_at
         db.session.add(post)
+        set_setting('registration_enabled', True)
         
         db.session.commit()
 
     yield app
 
-    # Close and remove the temporary database
+    # Close and remove the temporary database; closing the last connection
+    # also checkpoints and removes the WAL files
+    with app.app_context():
+        db.engine.dispose()
     os.close(db_fd)
     os.unlink(db_path)
 
@@ -104,8 +108,7 @@ def create_test_user(app):
             username='admin',
             password='password123',
             is_approved=True,
-            active=True,
-            registration_enabled=True
+            active=True
         )
         user.set_password('password123')  # Set the password hash
         db.session.add(user)
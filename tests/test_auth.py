@@ -2,6 +2,7 @@
 import pytest
 from flask import session
 from app.models.user import User
+from app.utils.settings import get_setting, set_setting
 from app import db
 
 def test_login(client, auth):
@@ -38,8 +39,7 @@ def test_register(client, auth, app):
     # Login as admin and enable registration
     auth.login()
     with app.app_context():
-        current_user = User.query.filter_by(email='admin@test.com').first()
-        current_user.registration_enabled = True
+        set_setting('registration_enabled', True)
         db.session.commit()
     
     auth.logout()
@@ -66,8 +66,7 @@ def test_register_validation(client, auth, app):
     # Login as admin and enable registration
     auth.login()
     with app.app_context():
-        current_user = User.query.filter_by(email='admin@test.com').first()
-        current_user.registration_enabled = True
+        set_setting('registration_enabled', True)
         db.session.commit()
     
     auth.logout()
@@ -101,8 +100,7 @@ def test_registration_disabled(client, auth, app):
     # Login as admin and disable registration
     auth.login()
     with app.app_context():
-        current_user = User.query.filter_by(email='admin@test.com').first()
-        current_user.registration_enabled = False
+        set_setting('registration_enabled', False)
         db.session.commit()
     
     auth.logout()
@@ -123,16 +121,14 @@ def test_toggle_registration(client, auth, app):
     assert response.headers['Location'] == '/admin/users'
     
     with app.app_context():
-        admin = User.query.filter_by(email='admin@test.com').first()
-        assert admin.registration_enabled is True
+        assert get_setting('registration_enabled') is True
     
     # Test disabling registration
     response = client.post('/admin/users/toggle-registration', data={})
     assert response.headers['Location'] == '/admin/users'
     
     with app.app_context():
-        admin = User.query.filter_by(email='admin@test.com').first()
-        assert admin.registration_enabled is False
+        assert get_setting('registration_enabled') is False
 
 def test_admin_user_list(client, auth, app):
     """Test that admin users are filtered out of user list."""
@@ -156,3 +152,240 @@ def test_admin_user_list(client, auth, app):
     assert response.status_code == 200
     assert b'regular@test.com' in response.data
     assert b'admin@test.com' not in response.data  # Admin should not be in list
+
+def test_login_makes_session_permanent(client, auth):
+    """Signing in sends a session cookie that outlives the browser."""
+    response = auth.login()
+    cookie = response.headers['Set-Cookie']
+    assert cookie.startswith('session=') and 'Expires=' in cookie
+
+def test_identity_cache_skips_auth_queries(app):
+    """Repeat loads of a signed-in user come from the identity cache."""
+    from sqlalchemy import event
+    from app.utils.identity import load_identity
+    with app.app_context():
+        user_id = User.query.filter_by(email='admin@test.com').first().fs_uniquifier
+        engine = db.engine
+    with app.test_request_context():
+        assert load_identity(user_id).is_admin
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        with app.test_request_context():
+            user = load_identity(user_id)
+            assert user.is_admin and user.username == 'admin'
+            assert user in db.session
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert statements == []
+
+def test_identity_cache_follows_user_changes(app):
+    """Role and approval changes reach the cache; new comments don't."""
+    from app.models.comment import Comment
+    from app.models.post import Post
+    from app.utils.identity import load_identity
+    with app.app_context():
+        user_id = User.query.filter_by(email='admin@test.com').first().fs_uniquifier
+    with app.test_request_context():
+        assert load_identity(user_id).is_admin
+        users = app.extensions['generations'].current('users')
+        post = Post.query.filter_by(slug='test-post').first()
+        db.session.add(Comment(content='Hi', post=post, author=post.author))
+        db.session.commit()
+        assert app.extensions['generations'].current('users') == users
+
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@test.com').first()
+        admin.roles = []
+        admin.is_approved = False
+        db.session.commit()
+    with app.test_request_context():
+        user = load_identity(user_id)
+        assert not user.is_admin and not user.is_approved
+
+def test_admin_pages_spend_no_queries_on_authorization(client, auth, app):
+    """An admin dashboard load only queries for what the page shows."""
+    from flask import g
+    from sqlalchemy import event
+    auth.login()
+    # The test app context outlives requests; forget the user each time, as a
+    # new request would
+    g.pop('_login_user', None)
+    client.get('/admin/')
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        g.pop('_login_user', None)
+        response = client.get('/admin/')
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200
+    # The three counts, then the recent posts
+    assert len(statements) == 2
+    assert not any('role' in s or 'fs_uniquifier' in s for s in statements)
+
+def test_login_rehashes_outdated_passwords(client, app):
+    """Logging in upgrades a hash made with older settings."""
+    from werkzeug.security import generate_password_hash
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@test.com').first()
+        admin.password = generate_password_hash('password123', method='pbkdf2:sha256:1000')
+        db.session.commit()
+
+    client.post('/auth/login', data={'email': 'admin@test.com', 'password': 'password123'})
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@test.com').first()
+        assert admin.password.startswith('scrypt:32768:8:1$')
+        assert admin.check_password('password123')
+        assert not admin.password_needs_rehash()
+
+def test_password_pool_sheds_load(client, app):
+    """Hashing runs in a process pool and refuses work past the queue limit."""
+    from app.utils.passwords import HasherBusy, PasswordHasher
+    hasher = PasswordHasher('pbkdf2:sha256:1000', workers=1, max_pending=1)
+    pwhash = hasher.hash('hunter2')
+    assert hasher.verify(pwhash, 'hunter2') and not hasher.verify(pwhash, 'hunter3')
+
+    app.extensions['passwords'] = hasher
+    hasher._slots.acquire()
+    try:
+        with pytest.raises(HasherBusy):
+            hasher.verify(pwhash, 'hunter2')
+        response = client.post('/auth/login', data={'email': 'admin@test.com', 'password': 'password123'})
+        assert response.status_code == 503
+    finally:
+        hasher._slots.release()
+
+def test_2fa_qr_code_is_cached_svg(client, auth, app, monkeypatch):
+    """The setup page shows an inline SVG code, drawn once per secret."""
+    import re
+    from qrcode.main import QRCode
+    from app.utils import qr
+    from app.utils.qr import provisioning_uri
+
+    rendered = []
+    render = qr.qr_svg
+    monkeypatch.setattr(qr, 'qr_svg', lambda data: rendered.append(data) or render(data))
+    auth.login()
+
+    response = client.get('/auth/setup-2fa')
+    assert response.status_code == 200
+    assert b'<svg' in response.data and b'data:image/png' not in response.data
+    client.get('/auth/setup-2fa')
+    assert len(rendered) == 1
+
+    # The path's runs cover exactly the dark modules of the code
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@test.com').first()
+        assert rendered[0] == provisioning_uri(admin.tf_totp_secret, admin.email)
+    code = QRCode(border=qr.BORDER)
+    code.add_data(rendered[0])
+    code.make(fit=True)
+    matrix = code.get_matrix()
+    drawn = [[False] * len(matrix) for _ in matrix]
+    path = re.search(r' d="([^"]+)"', response.data.decode()).group(1)
+    for row in re.findall(r'M[^M]+', path):
+        y = int(re.match(r'M\d+ (\d+)', row).group(1))
+        x = 0
+        for move, width in re.findall(r'[Mm](\d+)[ .\d]*h(\d+)', row):
+            x += int(move)
+            drawn[y][x:x + int(width)] = [True] * int(width)
+            x += int(width)
+    assert drawn == matrix
+
+    # A new secret gets a new code
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@test.com').first()
+        admin.tf_totp_secret = 'JBSWY3DPEHPK3PXP'
+        db.session.commit()
+    from flask import g
+    g.pop('_login_user', None)
+    client.get('/auth/setup-2fa')
+    assert len(rendered) == 2 and 'JBSWY3DPEHPK3PXP' in rendered[1]
+
+def test_registration_spends_one_lookup(client, app):
+    """The registration switch is cached, leaving one uniqueness query per sign-up."""
+    from sqlalchemy import event
+    client.get('/auth/register')
+    with app.app_context():
+        engine = db.engine
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        assert client.get('/auth/register').status_code == 200
+        assert statements == []
+        response = client.post('/auth/register', data={
+            'email': 'admin@test.com',
+            'username': 'someone',
+            'password': 'testpass123',
+            'confirm_password': 'testpass123'
+        })
+        assert b'Email already registered' in response.data
+        response = client.post('/auth/register', data={
+            'email': 'someone@test.com',
+            'username': 'admin',
+            'password': 'testpass123',
+            'confirm_password': 'testpass123'
+        })
+        assert b'Username already taken' in response.data
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert len(statements) == 2
+    assert all(statement.lstrip().startswith('SELECT') for statement in statements)
+    assert not any('site_settings' in statement or 'role' in statement for statement in statements)
+
+def test_settings_changes_reach_other_workers(app):
+    """Saving a setting invalidates the copies cached by other apps on the database."""
+    from app import create_app
+    other = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'],
+        'WTF_CSRF_ENABLED': False
+    })
+    with other.app_context():
+        assert get_setting('registration_enabled') is True
+    with app.app_context():
+        set_setting('registration_enabled', False)
+        db.session.commit()
+    with other.app_context():
+        assert get_setting('registration_enabled') is False
+        db.engine.dispose()
+
+def test_busy_hasher_spares_registration_and_verified_logins(client, app):
+    """A full hash pool turns sign-ups away with a 503 and skips login rehashes."""
+    from werkzeug.security import generate_password_hash
+    from app.utils.passwords import HasherBusy, PasswordHasher
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@test.com').first()
+        old_hash = generate_password_hash('password123', method='pbkdf2:sha256:1000')
+        admin.password = old_hash
+        db.session.commit()
+
+    class RehashBusy(PasswordHasher):
+        """Checks passwords, but has no room left to hash one"""
+        def hash(self, password):
+            raise HasherBusy()
+
+    app.extensions['passwords'] = RehashBusy('scrypt')
+    response = client.post('/auth/register', data={
+        'email': 'newuser@test.com',
+        'username': 'newuser',
+        'password': 'testpass123',
+        'confirm_password': 'testpass123'
+    })
+    assert response.status_code == 503
+    assert b'try again in a moment' in response.data
+    with app.app_context():
+        assert User.query.filter_by(email='newuser@test.com').first() is None
+
+    response = client.post('/auth/login', data={'email': 'admin@test.com', 'password': 'password123'})
+    assert response.headers['Location'] == '/'
+    with app.app_context():
+        assert User.query.filter_by(email='admin@test.com').first().password == old_hash
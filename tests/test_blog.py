@@ -1,5 +1,6 @@
 """Blog functionality tests"""
 import pytest
+from werkzeug.http import parse_date
 from app.models.post import Post
 from app import db, create_app
 
@@ -224,3 +225,329 @@ def test_edit_post_summary(client, auth, app, create_test_post):
         'original_title': 'Test Post'
     })
     assert b'Summary must be less than 500 characters' in response.data
+
+def test_feed_conditional_get(app, client):
+    """Unchanged polls get a 304 without touching the database."""
+    from sqlalchemy import event
+    response = client.get('/feed.xml')
+    assert response.status_code == 200
+    assert b'Test Post' in response.data
+    etag = response.headers['ETag']
+    last_modified = response.headers['Last-Modified']
+    assert not etag.startswith('W/')
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get('/feed.xml', headers={'If-None-Match': etag})
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert response.status_code == 304
+    assert statements == []
+
+    response = client.get('/feed.xml', headers={
+        'If-Modified-Since': last_modified
+    })
+    assert response.status_code == 304
+
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        post.title = 'Renamed Post'
+        db.session.commit()
+    response = client.get('/feed.xml', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Renamed Post' in response.data
+    assert response.headers['ETag'] != etag
+
+def test_feed_last_modified_moves_forward(app, client):
+    """Deleting the newest post still gives If-Modified-Since pollers the new feed."""
+    with app.app_context():
+        post = Post(title='Newest', content='<p>Fresh</p>', slug='newest', author_id=1)
+        post.publish()
+        db.session.add(post)
+        db.session.commit()
+    response = client.get('/feed.xml')
+    assert b'Newest' in response.data
+    last_modified = response.headers['Last-Modified']
+
+    # A draft doesn't change the feed, so its date stays put
+    with app.app_context():
+        db.session.add(Post(title='Draft', content='Soon', slug='draft', author_id=1))
+        db.session.commit()
+    response = client.get('/feed.xml', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+
+    with app.app_context():
+        db.session.delete(Post.query.filter_by(slug='newest').first())
+        db.session.commit()
+    response = client.get('/feed.xml', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 200
+    assert b'Newest' not in response.data
+    assert response.last_modified > parse_date(last_modified)
+
+def test_feed_formats(app, client):
+    """RSS, Atom and JSON Feed documents are well formed and honour the entry count."""
+    import json
+    from xml.etree import ElementTree
+    with app.app_context():
+        post = Post(title='Fish & <Chips>', content='<p>Crispy</p>', slug='fish-chips', author_id=1)
+        post.publish()
+        db.session.add(post)
+        db.session.commit()
+
+    rss = ElementTree.fromstring(client.get('/feed.xml').data)
+    assert [item.findtext('title') for item in rss.iter('item')] == ['Fish & <Chips>', 'Test Post']
+    assert rss.find('channel/item/{http://purl.org/rss/1.0/modules/content/}encoded').text == '<p>Crispy</p>'
+
+    response = client.get('/feed.atom')
+    assert response.mimetype == 'application/atom+xml'
+    atom = ElementTree.fromstring(response.data)
+    ns = {'atom': 'http://www.w3.org/2005/Atom'}
+    assert atom.find('atom:entry/atom:link', ns).get('href') == 'http://localhost/post/fish-chips'
+    assert atom.find('atom:entry/atom:author/atom:name', ns).text == 'admin'
+
+    response = client.get('/feed.json')
+    assert response.mimetype == 'application/feed+json'
+    feed = json.loads(response.data)
+    assert feed['version'] == 'https://jsonfeed.org/version/1.1'
+    assert [item['title'] for item in feed['items']] == ['Fish & <Chips>', 'Test Post']
+    assert feed['items'][0]['content_html'] == '<p>Crispy</p>'
+
+    app.config['FEED_ENTRY_COUNT'] = 1
+    assert len(json.loads(client.get('/feed.json').data)['items']) == 1
+
+def test_post_text_columns(app):
+    """Plain text and word count are kept in step with the content."""
+    with app.app_context():
+        post = Post(title='Words', content='<p>One &amp; two</p>' + ' word' * 399,
+                    slug='words', author_id=1)
+        db.session.add(post)
+        db.session.commit()
+        assert post.content_text.startswith('One & two word')
+        assert post.word_count == 401
+        assert post.reading_time == 2
+
+        post.content = '<p>Short now</p>'
+        db.session.commit()
+        assert (post.content_text, post.word_count, post.reading_time) == ('Short now', 2, 0)
+
+        long_reads = Post.query.filter(Post.reading_time >= 1).all()
+        assert post not in long_reads
+
+def test_reading_time_rounds_the_same_in_sql(app):
+    """Half minutes round up on an instance and in a query alike."""
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        for words, minutes in ((99, 0), (100, 1), (300, 2), (500, 3)):
+            post.word_count = words
+            db.session.commit()
+            assert post.reading_time == minutes
+            assert db.session.query(Post.reading_time).filter_by(id=post.id).scalar() == minutes
+
+def test_backfill_text_command(app):
+    """The backfill command fills in posts saved before the columns existed."""
+    with app.app_context():
+        for i in range(5):
+            db.session.add(Post(title=f'Old {i}', content=f'<b>old</b> post {i}',
+                                slug=f'old-{i}', author_id=1))
+        db.session.commit()
+        db.session.execute(Post.__table__.update().values(content_text=None, word_count=0))
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['posts', 'backfill-text', '--workers', '2', '--batch-size', '2'])
+    assert 'for 6 posts' in result.output
+
+    with app.app_context():
+        post = Post.query.filter_by(slug='old-3').first()
+        assert (post.content_text, post.word_count) == ('old post 3', 3)
+
+def test_backfill_keeps_updated_at(app):
+    """Backfilling derived text doesn't count as editing a post."""
+    from datetime import datetime
+    edited = datetime(2024, 1, 1, 12, 0)
+    with app.app_context():
+        db.session.execute(Post.__table__.update().values(content_text=None, updated_at=edited))
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['posts', 'backfill-text', '--workers', '1'])
+    assert 'for 1 posts' in result.output
+
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        assert post.content_text is not None
+        assert post.updated_at == edited
+
+def test_post_fragments_are_cached(client, auth, app):
+    """Post bodies and comment lists render once per version."""
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    from app.models.comment import Comment
+    from app.models.user import User
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        admin = User.query.filter_by(username='admin').first()
+        other = User(email='reader@test.com', username='reader', password='x')
+        db.session.add_all([
+            Comment(content='Older words', post=post, author=other,
+                    created_at=datetime(2024, 1, 1)),
+            Comment(content='Newer words', post=post, author=admin,
+                    created_at=datetime(2024, 1, 1) + timedelta(days=1)),
+        ])
+        db.session.commit()
+
+    body = client.get('/post/test-post').get_data(as_text=True)
+    assert body.index('Newer words') < body.index('Older words')
+    assert 'comment-actions' not in body and '/delete' not in body
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        assert b'This is a test post content.' in client.get('/post/test-post').data
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    # The post (with its comment version) and its neighbours
+    assert len(statements) == 3
+    assert not any('post.content' in s or 'FROM comments JOIN' in s for s in statements)
+
+    auth.login()
+    body = client.get('/post/test-post').get_data(as_text=True)
+    assert body.count('/delete') == 1
+
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        post.content = 'Rewritten body'
+        db.session.add(Comment(content='Newest words', post=post, author=post.author))
+        db.session.commit()
+    body = client.get('/post/test-post').get_data(as_text=True)
+    assert 'Rewritten body' in body and 'Newest words' in body
+    assert body.count('/delete') == 2
+
+def test_comment_list_survives_reused_ids(client, app):
+    """A new comment that takes a deleted comment's id still shows up."""
+    from app.models.comment import Comment
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        comment = Comment(content='Soon gone', post=post, author=post.author)
+        db.session.add(comment)
+        db.session.commit()
+        first_id = comment.id
+    assert b'Soon gone' in client.get('/post/test-post').data
+
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        db.session.delete(Comment.query.get(first_id))
+        db.session.commit()
+        comment = Comment(content='Brand new', post=post, author=post.author)
+        db.session.add(comment)
+        db.session.commit()
+        # Same count and same largest id as before
+        assert comment.id == first_id
+    body = client.get('/post/test-post').data
+    assert b'Brand new' in body and b'Soon gone' not in body
+
+def test_comments_paginate_with_load_more(client, app):
+    """Long threads show one page and serve the rest as JSON."""
+    import re
+    from datetime import datetime, timedelta
+    from app.models.comment import Comment
+    from app.models.user import User
+    app.config['COMMENTS_PER_PAGE'] = 10
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        readers = [User(email=f'r{i}@test.com', username=f'reader{i}', password='x') for i in range(3)]
+        db.session.add_all(readers)
+        db.session.add_all(
+            Comment(content=f'Comment {i:02d}', post=post, author=readers[i % 3],
+                    created_at=datetime(2024, 1, 1) + timedelta(minutes=i))
+            for i in range(25)
+        )
+        db.session.commit()
+        post_id = post.id
+
+    body = client.get('/post/test-post').get_data(as_text=True)
+    assert re.findall(r'Comment (\d\d)', body) == [f'{i:02d}' for i in range(24, 14, -1)]
+    next_url = re.search(r'data-url="([^"]+)"', body).group(1).replace('&amp;', '&')
+
+    seen = []
+    while next_url:
+        page = client.get(next_url).json
+        seen += [comment['content'] for comment in page['comments']]
+        assert page['html'].count('class="comment"') == len(page['comments'])
+        next_url = page['next_url']
+    assert seen == [f'Comment {i:02d}' for i in range(14, -1, -1)]
+    assert client.get(f'/post/{post_id + 100}/comments').status_code == 404
+
+def test_comment_counts_follow_comments(client, auth, app):
+    """Comment counts move with new, deleted and cascaded comments."""
+    from app.models.comment import Comment
+    from app.models.user import User
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        post_id, updated_at = post.id, post.updated_at
+
+    auth.login()
+    for text in ('First!', 'Second!'):
+        client.post(f'/post/{post_id}/comment', data={'content': text})
+    with app.app_context():
+        post = db.session.get(Post, post_id)
+        assert post.comment_count == 2
+        assert post.updated_at == updated_at
+        comment_id = Comment.query.filter_by(content='First!').first().id
+    client.post(f'/comment/{comment_id}/delete')
+
+    with app.app_context():
+        reader = User(email='reader@test.com', username='reader', password='x')
+        db.session.add(Comment(content='Drive-by', post_id=post_id, author=reader))
+        db.session.commit()
+        assert db.session.get(Post, post_id).comment_count == 2
+        db.session.delete(reader)
+        db.session.commit()
+        assert db.session.get(Post, post_id).comment_count == 1
+    assert '💬 1' in client.get('/').get_data(as_text=True)
+
+    with app.app_context():
+        db.session.execute(Post.__table__.update().values(comment_count=7))
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['posts', 'reconcile-comments'])
+    assert 'for 1 posts' in result.output
+    with app.app_context():
+        assert db.session.get(Post, post_id).comment_count == 1
+
+def test_post_navigation(client, app):
+    """Post pages link to the published posts on either side."""
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    with app.app_context():
+        author = Post.query.filter_by(slug='test-post').first().author
+        start = datetime(2030, 1, 1)
+        for i, slug in enumerate(['nav-a', 'nav-draft', 'nav-b', 'nav-c']):
+            post = Post(title=f'Nav {slug}', slug=slug, content='Navigate', author=author)
+            if slug != 'nav-draft':
+                post.publish()
+                post.published_at = start + timedelta(days=i)
+            db.session.add(post)
+        db.session.commit()
+        engine = db.engine
+
+    plans = []
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if '(post.published_at, post.id) ' in statement:
+            plans.append(cursor.connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall())
+    event.listen(engine, 'before_cursor_execute', explain)
+    try:
+        body = client.get('/post/nav-b').get_data(as_text=True)
+    finally:
+        event.remove(engine, 'before_cursor_execute', explain)
+    assert '/post/nav-a' in body and '/post/nav-c' in body
+    assert 'nav-draft' not in body
+    assert len(plans) == 2
+    assert all('ix_post_published_at_id' in str(plan) for plan in plans)
+
+    body = client.get('/post/nav-c').get_data(as_text=True)
+    assert '/post/nav-b' in body and '➡️' not in body.split('post-navigation')[1]
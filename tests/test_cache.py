@@ -0,0 +1,45 @@
+"""Cache utility tests"""
+import os
+import stat
+import time
+from flask import Flask
+from app.utils.cache import Generations, LRUCache
+from app.utils.runtime import runtime_path
+
+def test_lru_cache_evicts_least_recently_used():
+    """The oldest untouched entry goes first once the cache is full."""
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert len(cache) == 2
+
+def test_lru_cache_expires_entries():
+    """Entries disappear once their TTL has passed."""
+    cache = LRUCache(maxsize=4, ttl=0.01)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.02)
+    assert cache.get('a', 'gone') == 'gone'
+    assert len(cache) == 0
+
+def test_generations_are_shared_through_the_file(tmp_path):
+    """Counters bumped by one worker are seen by another."""
+    path = str(tmp_path / 'generations')
+    first, second = Generations(path), Generations(path)
+    assert first.current('content') == 0
+    assert second.bump('content') == 1
+    assert first.current('content') == 1
+    assert Generations(path).bump('content') == 2
+
+def test_runtime_files_default_to_a_private_folder(tmp_path):
+    """Shared runtime files live in the instance folder, out of other users' reach."""
+    app = Flask('app', instance_path=str(tmp_path / 'instance'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///blog.db'
+    path = runtime_path(app, 'ratelimits')
+    directory = os.path.dirname(path)
+    assert directory == str(tmp_path / 'instance' / 'runtime')
+    assert stat.S_IMODE(os.stat(directory).st_mode) & 0o077 == 0
@@ -0,0 +1,191 @@
+"""Page cache tests"""
+import socketserver
+import threading
+import pytest
+from app import db
+from app.models.comment import Comment
+from app.models.post import Post
+from app.pagecache import PageCache, STORES
+
+class RespStandIn(socketserver.ThreadingTCPServer):
+    """Just enough of a Redis server for the page cache"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RespHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                size = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(size + 2)[:-2])
+            self.wfile.write(self.reply(args[0].upper().decode(), args[1:]))
+
+    def reply(self, command, args):
+        data = self.server.data
+        with self.server.lock:
+            if command in ('PING', 'SELECT'):
+                return b'+OK\r\n'
+            if command == 'SET':
+                data[args[0]] = args[1]
+                return b'+OK\r\n'
+            if command == 'INCR':
+                data[args[0]] = b'%d' % (int(data.get(args[0], b'0')) + 1)
+                return b':%s\r\n' % data[args[0]]
+            values = [data.get(key) for key in args]
+            if command == 'GET':
+                return self.bulk(values[0])
+            if command == 'MGET':
+                return b'*%d\r\n' % len(values) + b''.join(map(self.bulk, values))
+        return b'-ERR unknown command\r\n'
+
+    @staticmethod
+    def bulk(value):
+        return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+@pytest.fixture(params=sorted(STORES))
+def page_cache(request, app, tmp_path):
+    """Install a page cache using each store in turn"""
+    server = None
+    if request.param == 'redis':
+        server = RespStandIn()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        app.config['PAGE_CACHE_URL'] = 'redis://127.0.0.1:%d/0' % server.server_address[1]
+    app.config['PAGE_CACHE_DIR'] = str(tmp_path / 'pages')
+    cache = PageCache(STORES[request.param](app), ttl=60)
+    app.extensions['page_cache'] = cache
+    yield cache
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+
+def test_anonymous_pages_are_cached_and_purged(app, client, page_cache):
+    """Repeat hits are served from the cache until a post changes."""
+    assert client.get('/').headers['X-Page-Cache'] == 'miss'
+    response = client.get('/')
+    assert response.headers['X-Page-Cache'] == 'hit'
+    assert b'Test Post' in response.data
+    assert client.get('/?utm_source=feed').headers['X-Page-Cache'] == 'hit'
+
+    client.get('/post/test-post')
+    assert client.get('/post/test-post').headers['X-Page-Cache'] == 'hit'
+
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        post.title = 'Edited Post'
+        db.session.commit()
+
+    response = client.get('/')
+    assert response.headers['X-Page-Cache'] == 'miss'
+    assert b'Edited Post' in response.data
+    response = client.get('/post/test-post')
+    assert response.headers['X-Page-Cache'] == 'miss'
+    assert b'Edited Post' in response.data
+
+def test_comments_purge_only_their_post(app, client, page_cache):
+    """A new comment purges its post page and the listings, not other posts."""
+    with app.app_context():
+        author = Post.query.filter_by(slug='test-post').first().author
+        # Published after the next post along, so not linked from test-post
+        for slug in ('next-post', 'other-post'):
+            other = Post(title=slug, slug=slug, content='Elsewhere', author=author)
+            other.publish()
+            db.session.add(other)
+            db.session.commit()
+    for url in ('/', '/post/test-post', '/post/other-post'):
+        client.get(url)
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        db.session.add(Comment(content='First!', post=post, author=post.author))
+        db.session.commit()
+
+    assert client.get('/post/other-post').headers['X-Page-Cache'] == 'hit'
+    response = client.get('/post/test-post')
+    assert response.headers['X-Page-Cache'] == 'miss'
+    assert b'First!' in response.data
+    response = client.get('/')
+    assert response.headers['X-Page-Cache'] == 'miss'
+    assert '💬 1' in response.get_data(as_text=True)
+
+def test_publishing_purges_post_navigation(app, client, page_cache):
+    """A newly published post shows up in its neighbour's links."""
+    client.get('/post/test-post')
+    with app.app_context():
+        author = Post.query.filter_by(slug='test-post').first().author
+        newer = Post(title='Newer Post', slug='newer-post', content='Fresh', author=author)
+        newer.publish()
+        db.session.add(newer)
+        db.session.commit()
+
+    response = client.get('/post/test-post')
+    assert response.headers['X-Page-Cache'] == 'miss'
+    assert b'/post/newer-post' in response.data
+
+def test_logged_in_users_bypass_the_cache(app, client, auth, page_cache):
+    """Signed-in visitors always get a freshly rendered page."""
+    client.get('/')
+    auth.login()
+    response = client.get('/')
+    assert 'X-Page-Cache' not in response.headers
+    assert b'Logout' in response.data
+
+def test_purge_during_render_skips_store(app, page_cache):
+    """A page rendered across a purge is not stored."""
+    with app.test_request_context('/'):
+        writes = page_cache.writes()
+        page_cache.purge({'listing'})
+        page_cache.save('key', app.response_class('stale'), {'listing'}, writes)
+        assert page_cache.load('key') is None
+
+def test_junk_query_args_and_hosts_share_a_key(client, page_cache):
+    """Arguments the view ignores, and the Host header, don't make new entries."""
+    client.get('/')
+    for url in ('/?page=1', '/?page=abc', '/?page=-3', '/?cursor=nonsense'):
+        assert client.get(url).headers['X-Page-Cache'] == 'hit', url
+    assert client.get('/', headers={'Host': 'anything.example'}).headers['X-Page-Cache'] == 'hit'
+    assert client.get('/?page=2').headers['X-Page-Cache'] == 'miss'
+
+def test_memory_store_purges_reach_other_workers(app, client):
+    """Unpublishing a post in one worker purges the pages cached by another."""
+    from app import create_app
+    from app.pagecache import MemoryStore
+    app.extensions['page_cache'] = PageCache(MemoryStore(app), ttl=60)
+    other = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'],
+        'PAGE_CACHE': 'memory'
+    })
+    other_client = other.test_client()
+    other_client.get('/post/test-post')
+    assert other_client.get('/post/test-post').headers['X-Page-Cache'] == 'hit'
+
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        post.is_published = False
+        db.session.commit()
+    assert other_client.get('/post/test-post').status_code == 404
+    with other.app_context():
+        db.engine.dispose()
+
+def test_filesystem_store_sweeps_old_and_excess_pages(app, tmp_path):
+    """Expired pages go first, then the oldest ones past the file cap."""
+    import os
+    from app.pagecache import FilesystemStore
+    app.config['PAGE_CACHE_DIR'] = str(tmp_path / 'pages')
+    app.config['PAGE_CACHE_MAX_FILES'] = 2
+    store = FilesystemStore(app)
+    for i, age in enumerate((500, 30, 20, 10)):
+        store.set(f'page-{i}', b'x', ttl=60)
+        path = store._entry_path(f'page-{i}')
+        mtime = os.path.getmtime(path) - age
+        os.utime(path, (mtime, mtime))
+    store.sweep(ttl=60)
+    assert [store.get(f'page-{i}') for i in range(4)] == [None, None, b'x', b'x']
@@ -0,0 +1,113 @@
+"""Keyset pagination tests"""
+import re
+from datetime import datetime, timedelta
+from app import db
+from app.models.post import Post
+from app.utils.pagination import decode_cursor, encode_cursor
+
+def add_posts(app, count):
+    """Publish ``count`` posts a minute apart, newest last"""
+    start = datetime(2024, 1, 1)
+    with app.app_context():
+        for i in range(count):
+            post = Post(title=f'Post {i:02d}', content='Body', slug=f'post-{i:02d}', author_id=1)
+            post.publish()
+            post.published_at = start + timedelta(minutes=i)
+            db.session.add(post)
+        db.session.commit()
+
+def titles(response):
+    return re.findall(r'>(Post \d\d|Test Post)</a>', response.get_data(as_text=True))
+
+def cursor_link(response, label):
+    match = re.search(r'href="/\?cursor=([\w-]+)" class="btn btn-nav">\s*' + label, response.get_data(as_text=True))
+    return match and match.group(1)
+
+def test_cursor_roundtrip():
+    """Tokens decode to what they encode and junk decodes to None."""
+    token = encode_cursor('next', datetime(2024, 5, 1, 12, 30), 42, 3)
+    assert decode_cursor(token) == ('next', datetime(2024, 5, 1, 12, 30), 42, 3)
+    assert decode_cursor('not-a-cursor') is None
+    assert decode_cursor(encode_cursor('sideways', datetime(2024, 5, 1), 1, 1)) is None
+
+def test_index_walks_forward_and_back(app, client):
+    """Next and previous cursors visit every post exactly once."""
+    add_posts(app, 11)
+    response = client.get('/')
+    assert titles(response) == ['Test Post', 'Post 10', 'Post 09', 'Post 08', 'Post 07']
+    assert 'Page 1 of 3' in response.get_data(as_text=True)
+
+    seen = titles(response)
+    pages = [response]
+    while (token := cursor_link(response, 'Next')):
+        response = client.get(f'/?cursor={token}')
+        seen += titles(response)
+        pages.append(response)
+    assert len(pages) == 3
+    assert 'Page 3 of 3' in pages[-1].get_data(as_text=True)
+    assert seen == ['Test Post'] + [f'Post {i:02d}' for i in range(10, -1, -1)]
+
+    response = client.get(f"/?cursor={cursor_link(pages[-1], '⬅️ Previous')}")
+    assert titles(response) == titles(pages[1])
+    response = client.get(f"/?cursor={cursor_link(response, '⬅️ Previous')}")
+    assert titles(response) == titles(pages[0])
+    assert cursor_link(response, '⬅️ Previous') is None
+
+def test_index_page_numbers_still_work(app, client):
+    """Old ?page=N links land on the same posts, and junk cursors on page one."""
+    add_posts(app, 11)
+    assert titles(client.get('/?page=2')) == ['Post 06', 'Post 05', 'Post 04', 'Post 03', 'Post 02']
+    assert titles(client.get('/?cursor=garbage'))[0] == 'Test Post'
+
+def test_cursor_pages_skip_offset_and_count(app, client):
+    """Cursor pages seek on the key and reuse the cached count."""
+    from sqlalchemy import event
+    add_posts(app, 11)
+    token = cursor_link(client.get('/'), 'Next')
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        client.get(f'/?cursor={token}')
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    post_queries = [s for s in statements if 'FROM post' in s]
+    assert len(post_queries) == 1
+    assert '(post.published_at, post.id) < (' in post_queries[0]
+    assert 'count(' not in post_queries[0]
+
+def test_admin_posts_paginate_by_cursor(app, client, auth):
+    """The admin post list pages through drafts and posts by cursor."""
+    add_posts(app, 11)
+    auth.login()
+    response = client.get('/admin/posts')
+    body = response.get_data(as_text=True)
+    assert 'Page 1 of 2' in body
+    token = re.search(r'/admin/posts\?cursor=([\w-]+)', body).group(1)
+    body = client.get(f'/admin/posts?cursor={token}').get_data(as_text=True)
+    assert 'Page 2 of 2' in body
+    assert '<td>Post 00</td>' in body and '<td>Test Post</td>' in body
+    assert body.count('<td>Post ') == 1
+
+def test_listings_skip_post_bodies(app, client, auth):
+    """Listing pages select card columns, never the post body."""
+    from sqlalchemy import event
+    add_posts(app, 3)
+    auth.login()
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        index = client.get('/')
+        client.get('/admin/')
+        client.get('/admin/posts')
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert 'This is a test post' in index.get_data(as_text=True)
+    post_queries = [s for s in statements if 'FROM post' in s]
+    assert post_queries and not any('post.content,' in s or 'post.content ' in s for s in post_queries)
@@ -0,0 +1,117 @@
+"""Query plan regression tests
+
+Each test runs a hot page, records the SELECTs it issues and asks SQLite for
+their plans. A plan that scans a whole table, or sorts rows itself instead of
+reading them in index order, means an index has gone missing.
+"""
+import re
+from pathlib import Path
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models.comment import Comment
+from app.models.post import Post
+from app.search.fts import SQLITE_RANK
+
+# Full table scans: "SCAN post", but not "SCAN post USING INDEX ..."
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+# Small tables that are read whole on purpose, like the settings snapshot
+WHOLE_TABLES = {'site_settings'}
+
+# Search hits are sorted by relevance, which no index can supply; only the
+# matched rows are sorted
+RANKED = f'ORDER BY {SQLITE_RANK}'
+
+def plan_problems(app, run):
+    """Run ``run`` and return the plan steps of its queries that need an index"""
+    with app.app_context():
+        engine = db.engine
+    problems = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith('SELECT'):
+            return
+        plan = cursor.connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        for step in plan:
+            detail = step[-1]
+            scan = FULL_SCAN.match(detail)
+            sorted_rows = 'TEMP B-TREE' in detail and RANKED not in statement
+            if (scan and scan.group(1) not in WHOLE_TABLES) or sorted_rows:
+                problems.append((detail, statement))
+
+    event.listen(engine, 'before_cursor_execute', explain)
+    try:
+        run()
+    finally:
+        event.remove(engine, 'before_cursor_execute', explain)
+    return problems
+
+@pytest.fixture
+def archive(app):
+    """A few published posts, a draft and some comments"""
+    with app.app_context():
+        post = Post.query.filter_by(slug='test-post').first()
+        for i in range(3):
+            other = Post(title=f'Archive {i}', slug=f'archive-{i}', content='Old news', author=post.author)
+            other.publish()
+            db.session.add(other)
+        db.session.add(Post(title='Draft', slug='draft', content='Not yet', author=post.author))
+        db.session.add_all(Comment(content=f'Comment {i}', post=post, author=post.author) for i in range(3))
+        db.session.commit()
+        return post.id
+
+def test_public_pages(app, client, archive):
+    """The home page, post pages and comment pages use indexes."""
+    def run():
+        client.get('/')
+        client.get('/?page=2')
+        client.get('/post/archive-1')
+        client.get('/post/test-post')
+        client.get(f'/post/{archive}/comments')
+    assert plan_problems(app, run) == []
+
+def test_feeds_search_and_suggestions(app, client, archive):
+    """The feeds, search results and title suggestions use indexes."""
+    def run():
+        client.get('/feed.xml')
+        client.get('/feed.atom')
+        client.get('/feed.json')
+        client.get('/search?q=news')
+        client.get('/search?q=news&page=2')
+        client.get('/search/suggest?q=arch')
+    assert plan_problems(app, run) == []
+
+def test_signed_in_pages(app, client, auth, archive):
+    """Loading the signed-in user and their roles uses indexes."""
+    auth.login()
+    def run():
+        client.get('/')
+        client.get('/post/test-post')
+    assert plan_problems(app, run) == []
+
+def test_admin_pages(app, client, auth, archive):
+    """The dashboard, post list and user list use indexes."""
+    auth.login()
+    def run():
+        client.get('/admin/')
+        client.get('/admin/posts')
+        client.get('/admin/users')
+    assert plan_problems(app, run) == []
+
+def test_migrations_create_model_indexes(tmp_path):
+    """A database built from migrations has every index the models declare."""
+    from flask_migrate import upgrade
+    from sqlalchemy import create_engine, inspect
+    from app import create_app
+    url = f'sqlite:///{tmp_path / "migrated.db"}'
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': url, 'SECRET_KEY': 'test-key'})
+    with app.app_context():
+        upgrade(directory=str(Path(__file__).parent.parent / 'migrations'))
+        tables = [db.metadata.tables[name] for name in ('post', 'comments', 'user', 'roles_users')]
+
+    migrated = inspect(create_engine(url))
+    for table in tables:
+        expected = {index.name for index in table.indexes}
+        assert expected <= {index['name'] for index in migrated.get_indexes(table.name)}
+    assert migrated.get_pk_constraint('roles_users')['constrained_columns'] == ['user_id', 'role_id']
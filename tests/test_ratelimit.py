@@ -0,0 +1,110 @@
+"""Rate limiter tests"""
+import pytest
+from sqlalchemy import event
+from app import create_app, db
+from app.models.comment import Comment
+from app.models.post import Post
+from app.utils.ratelimit import RateLimiter, parse_limit, parse_limits
+
+def test_parse_limits():
+    """Limits read as count/period, with off disabling one."""
+    assert parse_limit('10/minute') == (10, 60)
+    assert parse_limit('5 / hours') == (5, 3600)
+    assert parse_limit('off') is None
+    with pytest.raises(ValueError):
+        parse_limit('lots/fortnight')
+    assert parse_limits('auth.login=3/minute, main.add_comment=off') == {
+        'auth.login': '3/minute', 'main.add_comment': 'off'
+    }
+
+def test_sliding_window(tmp_path):
+    """Hits from the previous window count for the share of it still in the window."""
+    limiter = RateLimiter(str(tmp_path / 'limits'), slots=64)
+    for _ in range(4):
+        assert limiter.hit('client', 4, 60, now=30) == 0
+    # Full until the window ends
+    assert limiter.hit('client', 4, 60, now=59) == 1
+    # A quarter into the next window, three of the four old hits still count
+    assert limiter.hit('client', 4, 60, now=75) == 0
+    assert limiter.hit('client', 4, 60, now=75) == 15
+    # Other clients have their own counters
+    assert limiter.hit('someone-else', 4, 60, now=75) == 0
+    # Two windows on, everything has slid out
+    for _ in range(4):
+        assert limiter.hit('client', 4, 60, now=200) == 0
+
+def test_limits_are_shared_through_the_file(tmp_path):
+    """Workers opening the same table count hits together."""
+    path = str(tmp_path / 'limits')
+    first, second = RateLimiter(path, slots=64), RateLimiter(path, slots=64)
+    assert first.hit('client', 2, 60, now=0) == 0
+    assert second.hit('client', 2, 60, now=1) == 0
+    assert first.hit('client', 2, 60, now=2) == 58
+
+def test_full_table_takes_over_the_stalest_slot(tmp_path):
+    """A table with no free slot forgets whichever client expires first."""
+    limiter = RateLimiter(str(tmp_path / 'limits'), slots=2)
+    assert limiter.hit('old', 1, 60, now=0) == 0
+    assert limiter.hit('new', 1, 3600, now=100) == 0
+    assert limiter.hit('newest', 1, 60, now=110) == 0
+    assert limiter.hit('new', 1, 3600, now=120) > 0
+
+def test_expired_collision_does_not_reset_a_key(tmp_path):
+    """A key keeps its counts when a colliding key ahead of it expires."""
+    limiter = RateLimiter(str(tmp_path / 'limits'), slots=16)
+    start = RateLimiter._hash('client') % 16
+    other = next(f'other-{i}' for i in range(1000) if RateLimiter._hash(f'other-{i}') % 16 == start)
+    assert limiter.hit(other, 1, 1, now=0) == 0
+    for _ in range(3):
+        assert limiter.hit('client', 3, 3600, now=0) == 0
+    # The other key's slot has long expired, but the client's counts still hold
+    assert limiter.hit('client', 3, 3600, now=10) > 0
+    assert limiter.hit('client', 3, 3600, now=20) > 0
+
+def test_login_is_limited_before_any_query(app, client):
+    """Past the limit, login answers 429 without touching the database."""
+    app.extensions['rate_limits']['auth.login'] = (2, 60)
+    data = {'email': 'admin@test.com', 'password': 'wrong'}
+    assert client.post('/auth/login', data=data).status_code == 200
+    assert client.post('/auth/login', data=data).status_code == 200
+
+    with app.app_context():
+        engine = db.engine
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        response = client.post('/auth/login', data={'email': 'admin@test.com', 'password': 'password123'})
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    assert b'slow down' in response.data
+    assert statements == []
+    # Only POSTs count, so the form itself still loads
+    assert client.get('/auth/login').status_code == 200
+
+def test_comments_are_limited(app, client, auth):
+    """Comment posts past the limit are turned away."""
+    app.extensions['rate_limits']['main.add_comment'] = (2, 60)
+    auth.login()
+    with app.app_context():
+        post_id = Post.query.filter_by(slug='test-post').first().id
+    statuses = [
+        client.post(f'/post/{post_id}/comment', data={'content': f'Comment {i}'}).status_code
+        for i in range(3)
+    ]
+    assert statuses == [302, 302, 429]
+    with app.app_context():
+        assert Comment.query.filter_by(post_id=post_id).count() == 2
+
+def test_rate_limits_can_be_configured_and_disabled(tmp_path):
+    """RATELIMITS overrides the defaults and RATELIMIT_ENABLED turns limiting off."""
+    config = {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "limits.db"}'}
+    app = create_app({**config, 'RATELIMITS': {'auth.register': 'off', 'auth.login': '3/second'}})
+    assert 'auth.register' not in app.extensions['rate_limits']
+    assert app.extensions['rate_limits']['auth.login'] == (3, 1)
+    assert app.extensions['rate_limits']['main.add_comment'] == (10, 60)
+
+    app = create_app({**config, 'RATELIMIT_ENABLED': False})
+    assert 'rate_limiter' not in app.extensions
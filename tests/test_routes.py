@@ -50,3 +50,14 @@ def test_user_routes(client):
     for endpoint, kwargs in routes:
         url = url_for(endpoint, **kwargs)
         assert url is not None
+
+def test_public_pages_set_no_cookie(client):
+    """Anonymous GETs never start a session, so proxies can cache them"""
+    pages = [
+        '/', '/post/test-post', '/search?q=test', '/search/suggest?q=te',
+        '/feed.xml', '/feed.atom', '/feed.json'
+    ]
+    for page in pages:
+        response = client.get(page)
+        assert response.status_code == 200, page
+        assert 'Set-Cookie' not in response.headers, page
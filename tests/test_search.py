@@ -0,0 +1,267 @@
+"""Search backend tests"""
+import pytest
+from app import db
+from app.models.post import Post
+from app.models.user import User
+from app.search import get_backend, search_posts, BACKENDS
+from app.utils.cache import Generations
+
+def add_post(title, content, published=True, slug=None):
+    """Add a post written by the test admin"""
+    post = Post(
+        title=title,
+        content=content,
+        slug=slug or Post.generate_slug(title),
+        author=User.query.filter_by(username='admin').first()
+    )
+    if published:
+        post.publish()
+    db.session.add(post)
+    db.session.commit()
+    return post
+
+def test_auto_backend_uses_fts5(app):
+    """SQLite databases get the FTS5 backend by default."""
+    with app.app_context():
+        assert get_backend().name == 'sqlite-fts'
+
+def test_search_ranks_title_matches_first(app):
+    """Title matches outrank body matches."""
+    with app.app_context():
+        add_post('Soldering for beginners', '<p>Irons and flux.</p>')
+        add_post('Weekend notes', '<p>I did some <b>soldering</b> today.</p>')
+
+        results = search_posts('soldering')
+        assert [hit.title for hit in results.items] == [
+            'Soldering for beginners', 'Weekend notes'
+        ]
+        assert results.total == 2
+
+def test_search_skips_drafts_and_tracks_publishing(app):
+    """Only published posts are indexed, following publish and delete."""
+    with app.app_context():
+        post = add_post('Modem noises', 'Screeching handshakes', published=False)
+        assert search_posts('modem').total == 0
+
+        post.publish()
+        db.session.commit()
+        assert search_posts('modem').total == 1
+
+        post.content = 'Nothing to see here'
+        db.session.commit()
+        assert search_posts('handshakes').total == 0
+
+        post.unpublish()
+        db.session.commit()
+        assert search_posts('modem').total == 0
+
+        post.publish()
+        db.session.commit()
+        db.session.delete(post)
+        db.session.commit()
+        assert search_posts('modem').total == 0
+
+def test_search_ignores_rolled_back_changes(app):
+    """Rolled back edits never reach the index."""
+    with app.app_context():
+        post = add_post('Floppy disks', 'Three and a half inches')
+        post.title = 'Zip disks'
+        db.session.flush()
+        db.session.rollback()
+        assert search_posts('floppy').total == 1
+        assert search_posts('zip').total == 0
+
+def test_search_paginates(app):
+    """Results come back one page at a time."""
+    with app.app_context():
+        for i in range(7):
+            add_post(f'Pixel art {i}', 'Tiny squares')
+
+        first = search_posts('pixel', page=1, per_page=5)
+        second = search_posts('pixel', page=2, per_page=5)
+        assert first.total == 7
+        assert first.pages == 2
+        assert len(first.items) == 5 and first.has_next
+        assert len(second.items) == 2 and not second.has_next
+
+@pytest.mark.parametrize('backend', sorted(set(BACKENDS) - {'postgres'}))
+def test_backends_agree(app, backend):
+    """Every SQLite-capable backend finds the same posts."""
+    with app.app_context():
+        add_post('Webring etiquette', 'Link your webring neighbours')
+        results = BACKENDS[backend](app).search('webring')
+        assert [hit.title for hit in results.items] == ['Webring etiquette']
+        if backend != 'like':  # like snippets come from the summary
+            assert '<mark>' in results.items[0].snippet
+
+def test_snippets_are_escaped_and_highlighted(app):
+    """Snippets come from plain text with only the matches marked up."""
+    with app.app_context():
+        add_post('Markup', '<p>Use <code>&lt;blink&gt;</code> tags sparingly, blink is loud</p>')
+        snippet = str(search_posts('blink').items[0].snippet)
+        assert '<mark>blink</mark>' in snippet
+        assert '&lt;' in snippet
+        assert '<code>' not in snippet and '<p>' not in snippet
+
+def test_search_page_does_not_load_bodies(app, client):
+    """The results page never selects the content column."""
+    from sqlalchemy import event
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get('/search?q=test')
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert b'<mark>' in response.data
+    assert statements and not any('post.content' in statement for statement in statements)
+
+def test_search_page(client):
+    """The search page renders ranked results."""
+    response = client.get('/search?q=test')
+    assert response.status_code == 200
+    assert b'Test Post' in response.data
+
+def test_inverted_index_snapshot_roundtrip(tmp_path):
+    """A saved index reopens through mmap with identical results."""
+    from app.search.inverted import InvertedIndex
+    index = InvertedIndex()
+    index.add(1, 'Retro modems', 'dial up handshakes and modem noises')
+    index.add(2, 'Cats', 'my cat sits on the modem')
+    index.add(3, 'Gone soon', 'modem modem modem')
+    index.remove(3)
+
+    path = str(tmp_path / 'search.idx')
+    index.save(path)
+    loaded = InvertedIndex.load(path)
+
+    assert len(loaded) == 2
+    assert [post_id for post_id, _ in loaded.search(['modem'])] == [1, 2]
+    assert [post_id for post_id, _ in loaded.search([], [['modem', 'noises']])] == [1]
+    assert loaded.search(['hand']) == index.search(['hand'])
+
+    loaded.add(2, 'Cats', 'no electronics here')
+    assert [post_id for post_id, _ in loaded.search(['modem'])] == [1]
+
+def use_memory_backend(app, tmp_path):
+    """Install a memory backend so commits are applied to it"""
+    app.config['SEARCH_INDEX_PATH'] = str(tmp_path / 'search.idx')
+    backend = app.extensions['search'] = BACKENDS['memory'](app)
+    return backend
+
+def test_memory_backend_tracks_posts(app, tmp_path):
+    """The memory backend follows commits and phrase queries."""
+    with app.app_context():
+        backend = use_memory_backend(app, tmp_path)
+        assert [hit.title for hit in backend.search('test').items] == ['Test Post']
+
+        post = add_post('Dice goblins', 'Rolling natural twenties')
+        assert backend.search('"natural twenties"').total == 1
+        assert backend.search('"twenties natural"').total == 0
+
+        post.unpublish()
+        db.session.commit()
+        assert backend.search('dice').total == 0
+
+def test_memory_backend_warm_start(app, tmp_path):
+    """A fresh worker reuses the snapshot and picks up missed changes."""
+    app.config['SEARCH_INDEX_PATH'] = str(tmp_path / 'search.idx')
+    with app.app_context():
+        BACKENDS['memory'](app).search('test')
+
+        # Committed while no memory-backed worker was running
+        add_post('Neon signs', 'Glowing tubes')
+
+        worker = use_memory_backend(app, tmp_path)
+        assert worker.search('neon').total == 1
+        assert worker.search('test').total == 1
+
+        # Another worker reopens the snapshot this one rewrites
+        other = BACKENDS['memory'](app)
+        other.search('test')
+        post = Post.query.filter_by(title='Neon signs').first()
+        post.title = 'Argon signs'
+        db.session.commit()
+        assert other.search('argon').total == 1
+
+def test_suggest_prefix_index():
+    """Titles match by prefix at any word, title starts first."""
+    from datetime import datetime
+    from app.search.suggest import TitleSuggester
+    suggester = TitleSuggester()
+    suggester.add(1, 'Fun with Hex Editors', 'fun-with-hex', datetime(2024, 1, 1))
+    suggester.add(2, 'Hexagonal dice', 'hexagonal-dice', datetime(2023, 1, 1))
+    suggester.add(3, 'Hex Editors 2', 'hex-editors-2', datetime(2025, 1, 1))
+
+    assert [slug for _, slug in suggester.suggest('hex')] == [
+        'hex-editors-2', 'hexagonal-dice', 'fun-with-hex'
+    ]
+    assert suggester.suggest('hex ed', limit=1) == [('Hex Editors 2', 'hex-editors-2')]
+
+    suggester.add(3, 'Octal Editors', 'octal-editors', datetime(2025, 1, 1))
+    suggester.remove(2)
+    assert [slug for _, slug in suggester.suggest('hex')] == ['fun-with-hex']
+
+def test_suggest_endpoint_follows_publishing(app, client):
+    """The endpoint serves published titles and tracks admin changes."""
+    response = client.get('/search/suggest?q=te')
+    assert response.json['results'] == [
+        {'title': 'Test Post', 'slug': 'test-post', 'url': '/post/test-post'}
+    ]
+
+    with app.app_context():
+        post = add_post('Terminal tricks', 'Bash it', published=False)
+        assert client.get('/search/suggest?q=term').json['results'] == []
+
+        post.publish()
+        db.session.commit()
+        assert [r['slug'] for r in client.get('/search/suggest?q=term').json['results']] == ['terminal-tricks']
+
+        post.title = 'Shell tricks'
+        db.session.commit()
+        assert client.get('/search/suggest?q=term').json['results'] == []
+        assert client.get('/search/suggest?q=tricks').json['results'][0]['title'] == 'Shell tricks'
+
+        post.unpublish()
+        db.session.commit()
+        assert client.get('/search/suggest?q=shell').json['results'] == []
+
+def test_search_cache_follows_content_generation(app):
+    """Repeat searches skip the backend until a post changes."""
+    with app.app_context():
+        post = add_post('Pinball wizardry', 'Flippers and tilt sensors')
+        calls = []
+        backend = get_backend()
+        search = backend.search
+        backend.search = lambda *args, **kwargs: calls.append(args) or search(*args, **kwargs)
+
+        assert search_posts('pinball').total == 1
+        assert search_posts('  PINBALL ').total == 1
+        assert len(calls) == 1
+
+        post.unpublish()
+        db.session.commit()
+        assert search_posts('pinball').total == 0
+        assert len(calls) == 2
+
+        # Another worker bumping the shared counter also invalidates
+        search_posts('flippers')
+        Generations(app.extensions['generations'].path).bump('content')
+        search_posts('flippers')
+        assert len(calls) == 4
+
+def test_suggest_reloads_after_other_worker_commits(app):
+    """Titles reload when the generation moved without this worker."""
+    from app.search import suggest_titles
+    with app.app_context():
+        assert suggest_titles('vacuum') == []
+        db.session.execute(
+            Post.__table__.update().where(Post.slug == 'test-post').values(title='Vacuum tubes')
+        )
+        db.session.commit()
+        assert suggest_titles('vacuum') == []
+
+        app.extensions['generations'].bump('content')
+        assert suggest_titles('vacuum') == [('Vacuum tubes', 'test-post')]